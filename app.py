@@ -1,14 +1,28 @@
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+import asyncio
 import uuid
+import base64
 import json
-import hashlib
+import time
+from datetime import datetime, timezone
 import traceback
+import os
+from langgraph.types import Overwrite
 from src.graph import create_graph
 from src.state import State
+from src.utils.data_loader import backend as data_backend, query_metrics
+from src.utils.session_store import SessionStore, DiskSpill
+from src.utils.checkpointer import create_checkpointer, thread_config, thread_ids, CheckpointSpill, STATE_DB_PATH
+from src.utils.thread_versions import ThreadVersions
+from src.utils.run_admission import RunAdmission, RunStreamingResponse
+from src.utils.messages import format_message, message_window, MessageLog
+from src.utils.serialization import encode, sse_event
+from src.utils.intents import classify
+from src.utils.thread_template import ThreadTemplate
 
 app = FastAPI(title="SunBun Solar Assistant API")
 
@@ -21,8 +35,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store sessions in memory
-sessions: Dict[str, State] = {}
 
 @app.get("/")
 async def root():
@@ -33,11 +45,52 @@ async def root():
     }
 
 @app.get("/debug/sessions")
-async def debug_sessions():
-    return {"session_count": len(sessions), "ids": list(sessions.keys())}
+def debug_sessions(limit: Optional[int] = None, cursor: Optional[str] = None):
+    rows, next_cursor = thread_page(limit, cursor)
+    return {"session_count": len(sessions), "ids": [row[0] for row in rows], "next_cursor": next_cursor,
+            "store": sessions.stats(), "runs": admission.stats(), "template": thread_template.stats()}
 
-# Global graph instance
-graph = create_graph()
+@app.get("/sites/{site_id}/metrics")
+def site_metrics(site_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                 period: Optional[str] = None, last: Optional[int] = None):
+    try:
+        return json_response(query_metrics(site_id, start, end, period, last))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/debug/data")
+async def debug_data():
+    return data_backend.describe()
+
+@app.on_event("startup")
+async def start_data_watcher():
+    # Load tables up front and pick up supportingData drops without a restart
+    data_backend.start_watcher(float(os.environ.get("DATA_RELOAD_INTERVAL", "2")))
+
+# Global graph instance, checkpointing every step per thread_id so restarts resume conversations
+graph = create_graph(create_checkpointer())
+
+# Thread registry and versions shared by every worker process (uvicorn --workers N)
+versions = ThreadVersions(STATE_DB_PATH)
+versions.backfill(thread_ids(graph.checkpointer))
+
+# Recently used thread states stay in memory; idle or stale ones are reloaded from their checkpoint,
+# or from SESSION_SPILL_DIR for threads without one (never run, or checkpoints not durable)
+SESSION_SPILL_DIR = os.environ.get("SESSION_SPILL_DIR", ".sessions")
+sessions = SessionStore(
+    max_resident=int(os.environ.get("SESSION_MAX_RESIDENT", "1000")),
+    idle_ttl=float(os.environ.get("SESSION_IDLE_TTL_SECONDS", "1800")),
+    spill=CheckpointSpill(graph, DiskSpill(SESSION_SPILL_DIR)),
+    versions=versions,
+)
+
+# Runs on one thread go in order; across threads cap concurrent graph runs and the queue behind them
+admission = RunAdmission(
+    max_running=int(os.environ.get("MAX_CONCURRENT_RUNS", "16")),
+    max_waiting=int(os.environ.get("RUN_QUEUE_LIMIT", "64")),
+    max_wait_seconds=float(os.environ.get("RUN_QUEUE_TIMEOUT_SECONDS", "10")),
+)
+RUN_RETRY_AFTER_SECONDS = os.environ.get("RUN_RETRY_AFTER_SECONDS", "2")
 
 def get_initial_state(task_id: str) -> State:
     return {
@@ -64,11 +117,24 @@ def get_initial_state(task_id: str) -> State:
         "sales_step": None,
         "representative_available": None,
         "messages": [],
+        "prompts": {},
         "lookup_retries": 0,
         "lookup_retry_choice": None,
         "auth_otp_retries": 0
     }
 
+def build_thread_template() -> State:
+    state = get_initial_state("")
+    try:
+        # No checkpointer: this run belongs to no thread
+        return create_graph().invoke(state)
+    except Exception:
+        traceback.print_exc()
+        return state
+
+# State of every new thread (greeting included), built once instead of a graph run per thread
+thread_template = ThreadTemplate(build_thread_template)
+
 # --- LANGGRAPH API COMPATIBILITY ---
 
 @app.middleware("http")
@@ -78,6 +144,49 @@ async def log_requests(request: Request, call_next):
     print(f"DEBUG: Response status: {response.status_code}")
     return response
 
+def json_response(payload, headers: Optional[Dict[str, str]] = None) -> Response:
+    # State payloads go through the fast encoder and the per-message fragment cache
+    return Response(content=encode(payload), media_type="application/json", headers=headers)
+
+# Thread listing pages; the default fields are the ones the thread list shows
+THREAD_PAGE_SIZE = int(os.environ.get("THREAD_PAGE_SIZE", "100"))
+THREAD_PAGE_MAX = 1000
+THREAD_LIST_FIELDS = ["thread_id", "id", "status"]
+
+def encode_cursor(updated_at: float, thread_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([updated_at, thread_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        updated_at, thread_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(updated_at), str(thread_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def thread_page(limit: Optional[int], cursor: Optional[str], offset: int = 0) -> Tuple[List[Tuple], Optional[str]]:
+    """
+    One page of registry rows, most recently updated first, and the cursor of
+    the next page (None on the last one). Keyset paging on the registry's
+    (updated_at, thread_id) index, so deep pages cost the same as the first.
+    """
+    size = min(max(int(limit or THREAD_PAGE_SIZE), 1), THREAD_PAGE_MAX)
+    rows = versions.page(size + 1, decode_cursor(cursor) if cursor else None, max(int(offset or 0), 0))
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(rows[-1][2], rows[-1][0])
+
+def iso_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+def thread_summary(row: Tuple, fields: List[str]) -> Dict:
+    """The `fields` of a listed thread; values are only loaded when asked for."""
+    tid, _, updated_at, lease_until = row
+    known = {"thread_id": tid, "id": tid, "updated_at": iso_time(updated_at),
+             "status": "busy" if lease_until and lease_until > time.time() else "idle"}
+    full = get_thread_object(tid) if any(f not in known for f in fields) else {}
+    return {f: known[f] if f in known else full[f] for f in fields if f in known or f in full}
+
 def get_thread_object(tid: str):
     return {
         "thread_id": tid,
@@ -86,7 +195,8 @@ def get_thread_object(tid: str):
         "updated_at": "2026-02-22T00:00:00Z",
         "status": "idle",
         "metadata": {},
-        "values": sessions.get(tid, {})
+        # Listing shouldn't pull every spilled session back into memory
+        "values": sessions.peek(tid) or thread_template.clone(tid)
     }
 
 @app.get("/info")
@@ -106,112 +216,168 @@ async def get_info():
 @app.get("/v1/threads")
 @app.post("/threads/search")
 @app.post("/v1/threads/search")
-async def search_threads():
-    return [get_thread_object(tid) for tid in sessions.keys()]
+def search_threads(limit: Optional[int] = None, offset: Optional[int] = None, cursor: Optional[str] = None,
+                   select: Optional[List[str]] = Query(None), body: Optional[Dict[str, Any]] = Body(None)):
+    # GET takes query params, the SDK's POST search sends the same ones as JSON
+    body = body or {}
+    limit = limit if limit is not None else body.get("limit")
+    offset = offset if offset is not None else body.get("offset")
+    cursor = cursor or body.get("cursor")
+    select = select or body.get("select") or THREAD_LIST_FIELDS
+    if isinstance(select, str):
+        select = [select]
+    fields = [f for s in select for f in s.split(",") if f]
+
+    rows, next_cursor = thread_page(limit, cursor, offset or 0)
+    headers = {"X-Pagination-Next": next_cursor} if next_cursor else None
+    return json_response([thread_summary(row, fields) for row in rows], headers)
+
+def require_thread(thread_id: str):
+    # Reads never register ids: only creating a thread or starting a run does
+    if versions.current(thread_id) is None:
+        raise HTTPException(status_code=404, detail=f"Thread {thread_id} not found")
 
 @app.post("/threads")
 @app.post("/v1/threads")
-async def create_thread():
+def create_thread():
     thread_id = str(uuid.uuid4())
-    state = get_initial_state(thread_id)
-    try:
-        new_state = graph.invoke(state)
-        sessions[thread_id] = new_state
-    except:
-        sessions[thread_id] = state
-    return get_thread_object(thread_id)
+    versions.register(thread_id)
+    sessions[thread_id] = thread_template.clone(thread_id)
+    return json_response(get_thread_object(thread_id))
 
 @app.get("/threads/{thread_id}")
 @app.get("/v1/threads/{thread_id}")
 def get_thread(thread_id: str):
-    if thread_id not in sessions:
-        state = get_initial_state(thread_id)
-        try:
-            sessions[thread_id] = graph.invoke(state)
-        except:
-            sessions[thread_id] = state
-    return get_thread_object(thread_id)
+    require_thread(thread_id)
+    return json_response(get_thread_object(thread_id))
 
 @app.get("/threads/{thread_id}/state")
 @app.get("/v1/threads/{thread_id}/state")
 @app.post("/threads/{thread_id}/state")
 @app.post("/v1/threads/{thread_id}/state")
-def get_thread_state(thread_id: str):
-    if thread_id not in sessions:
-        state = get_initial_state(thread_id)
-        try:
-            sessions[thread_id] = graph.invoke(state)
-        except:
-            sessions[thread_id] = state
+def get_thread_state(thread_id: str, after_message_id: Optional[str] = None, limit: Optional[int] = None,
+                     body: Optional[Dict[str, Any]] = Body(None)):
+    after_message_id, limit = window_params(after_message_id, limit, body)
+    require_thread(thread_id)
             
-    state = sessions[thread_id]
+    # A registered thread without a checkpoint hasn't run yet: it's at the template
+    state = sessions.get(thread_id) or thread_template.clone(thread_id)
     formatted_state = state.copy()
-    formatted_state["messages"] = [format_message(m, i) for i, m in enumerate(state.get("messages", []))]
-    return {
+    formatted = [format_message(m, i) for i, m in enumerate(state.get("messages", []))]
+    window, more = message_window(formatted, after_message_id, limit)
+    if window is None:
+        raise HTTPException(status_code=404, detail=f"Message {after_message_id} not found in thread")
+    formatted_state["messages"] = window
+    # The next page starts after the last message returned
+    headers = {"X-Pagination-Next": window[-1]["id"]} if more and window else None
+    return json_response({
         "values": formatted_state, 
         "next": [], 
         "checkpoint": {"thread_id": thread_id, "checkpoint_id": "latest"},
         "metadata": {}
-    }
+    }, headers)
 
 @app.get("/threads/{thread_id}/history")
 @app.get("/v1/threads/{thread_id}/history")
 @app.post("/threads/{thread_id}/history")
 @app.post("/v1/threads/{thread_id}/history")
-def get_thread_history(thread_id: str):
-    if thread_id not in sessions:
-        state = get_initial_state(thread_id)
-        try:
-            sessions[thread_id] = graph.invoke(state)
-        except:
-            sessions[thread_id] = state
-            
-    state = sessions[thread_id]
+def get_thread_history(thread_id: str, after_message_id: Optional[str] = None, limit: Optional[int] = None,
+                       body: Optional[Dict[str, Any]] = Body(None)):
+    # `limit` counts checkpoints here, as in the Agent Protocol; `after_message_id` trims each one's messages
+    after_message_id, limit = window_params(after_message_id, limit, body)
+    require_thread(thread_id)
+
+    snapshots = graph.get_state_history(thread_config(thread_id), limit=limit)
+    history = [format_snapshot(thread_id, s, after_message_id) for s in snapshots]
+    if history:
+        return json_response(history)
+
+    # No run yet, so no checkpoints: the thread is at the template
+    state = sessions.get(thread_id) or thread_template.clone(thread_id)
     formatted_state = state.copy()
-    formatted_state["messages"] = [format_message(m, i) for i, m in enumerate(state.get("messages", []))]
-    return [{
+    formatted = [format_message(m, i) for i, m in enumerate(state.get("messages", []))]
+    formatted_state["messages"] = message_window(formatted, after_message_id)[0] or []
+    return json_response([{
         "values": formatted_state, 
         "next": [], 
         "checkpoint": {"thread_id": thread_id, "checkpoint_id": "latest"},
         "metadata": {}
-    }]
+    }])
 
-def format_message(m, idx=0):
-    """Ensure message is a dict with type, content, and STABLE id."""
-    try:
-        if isinstance(m, str):
-            content = m or " "
-            # Default to AI for strings unless they look like human input handled by nodes
-            mid = f"msg-{hashlib.md5((content + str(idx)).encode()).hexdigest()[:12]}"
-            return {"type": "ai", "content": content, "id": mid}
-        
-        if isinstance(m, dict):
-            content = m.get("content") or m.get("text") or " "
-            mtype = m.get("type") or m.get("role") or "ai"
-            msg_id = m.get("id") or f"{mtype}-{hashlib.md5((content + str(idx)).encode()).hexdigest()[:12]}"
-            
-            msg_obj = {"type": mtype, "content": content, "id": msg_id}
-            # Standard buttons/options for Aegra
-            options = m.get("buttons") or (m.get("additional_kwargs") or {}).get("options")
-            if options:
-                msg_obj["additional_kwargs"] = {"options": options}
-            return msg_obj
-    except Exception:
-        return {"type": "ai", "content": str(m), "id": f"err-{uuid.uuid4().hex[:8]}"}
-    return m
+def window_params(after_message_id: Optional[str], limit: Optional[int], body: Optional[Dict]) -> Tuple[Optional[str], Optional[int]]:
+    """Message paging params from the query string, or the JSON body of the POST variants."""
+    body = body or {}
+    after_message_id = after_message_id or body.get("after_message_id")
+    limit = limit if limit is not None else body.get("limit")
+    return after_message_id, None if limit is None else max(int(limit), 0)
+
+def format_snapshot(thread_id: str, snapshot, after_message_id: Optional[str] = None):
+    """One checkpoint of a thread in the Agent Protocol history shape."""
+    values = dict(snapshot.values)
+    formatted = [format_message(m, i) for i, m in enumerate(values.get("messages", []))]
+    # Checkpoints from before `after_message_id` was sent have nothing after it
+    values["messages"] = (message_window(formatted, after_message_id)[0] or []) if after_message_id else formatted
+    parent = snapshot.parent_config["configurable"]["checkpoint_id"] if snapshot.parent_config else None
+    return {
+        "values": values,
+        "next": list(snapshot.next),
+        "checkpoint": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": snapshot.config["configurable"]["checkpoint_id"]},
+        "parent_checkpoint": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": parent} if parent else None,
+        "metadata": snapshot.metadata or {},
+        "created_at": snapshot.created_at
+    }
+
+def changed_keys(known: Dict, values: Dict) -> Dict:
+    """Top-level keys (other than messages) whose value differs from what the client already has."""
+    return {k: v for k, v in values.items() if k != "messages" and known.get(k) != v}
+
+def delta_event(version, seq: int, messages: List, values: Dict) -> bytes:
+    return sse_event("delta", {"seq": seq, "messages": messages, "values": values}, f"{version}.{seq}")
 
 @app.post("/threads/{thread_id}/runs/stream")
 @app.post("/v1/threads/{thread_id}/runs/stream")
 async def run_stream(thread_id: str, request: Request):
-    if thread_id not in sessions:
-        sessions[thread_id] = get_initial_state(thread_id)
+    slot = await admission.enter(thread_id)
+    if slot is None:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many runs in progress; retry shortly."},
+            headers={"Retry-After": RUN_RETRY_AFTER_SECONDS}
+        )
+    try:
+        return await start_run(thread_id, request, slot)
+    except BaseException:
+        slot.release()
+        raise
+
+def finish_run(thread_id: str, run_token: str, update: Optional[Dict]) -> Optional[int]:
+    """Release a claimed turn and cache the state it ended with; returns the new version."""
+    version = versions.release(thread_id, run_token)
+    if update is not None:
+        sessions.put(thread_id, update, version)
+    return version
+
+async def start_run(thread_id: str, request: Request, slot):
+    """Apply the request's input to the thread and stream the graph run; `slot` is freed when the run ends."""
+    config = thread_config(thread_id)
+    # The registry and session store are SQLite shared with other workers: their calls
+    # can wait on a write lock, so they run on a worker thread, never on the event loop.
+    # A thread first seen here was never greeted, so it starts blank rather than from the template
+    unseen = await asyncio.to_thread(versions.register, thread_id)
+    # Version first, then state: the claim below fails if the thread moved on in between
+    expected_version = await asyncio.to_thread(versions.current, thread_id)
+    # Resume from the thread's latest checkpoint; threads that never ran have none
+    saved = (await graph.aget_state(config)).values
+    base = saved or await asyncio.to_thread(sessions.get, thread_id)
+    base = base or (get_initial_state(thread_id) if unseen else thread_template.clone(thread_id))
     
     try:
         body = await request.json()
     except:
         body = {}
         
-    state = sessions[thread_id]
+    state = base.copy()
+    state["messages"] = list(base.get("messages", []))
     run_id = str(uuid.uuid4())
     
     # Process inputs
@@ -224,20 +390,21 @@ async def run_stream(thread_id: str, request: Request):
             
             # Map choice buttons to state
             is_button = False
+            intent = classify(content)
             
-            if "Sales Support" in content: 
+            if "Sales Support" in intent: 
                  state["support_type"] = "sales"
                  is_button = True
-            elif "Service Support" in content: 
+            elif "Service Support" in intent: 
                  state["support_type"] = "service"
                  is_button = True
-            elif "Use email" in content or "Use phone" in content:
+            elif "Use email" in intent or "Use phone" in intent:
                  # It's an auth selection, we let auth.py handle this via checking the message
                  pass
-            elif "happy" in content.lower():
+            elif "happy" in intent:
                  state["service_resolution_status"] = "happy"
                  is_button = True
-            elif "still need help" in content.lower():
+            elif "still need help" in intent:
                  state["service_resolution_status"] = "unhappy"
                  state["ticket_id"] = None
                  state["description"] = None
@@ -245,20 +412,16 @@ async def run_stream(thread_id: str, request: Request):
                  state["handoff_type"] = None
                  state["representative_available"] = None
                  is_button = True
-            elif "try again" in content.lower() and state.get("in_db") is False:
+            elif "try again" in intent and state.get("in_db") is False:
                  state["lookup_retry_choice"] = "Try again"
                  is_button = True
-            elif "continue anyway" in content.lower() and state.get("in_db") is False:
+            elif "continue anyway" in intent and state.get("in_db") is False:
                  state["lookup_retry_choice"] = "No, continue anyway"
                  is_button = True
-            elif any(cat.lower() in content.lower() for cat in ["production issue", "system not working", "communication loss", "battery failure", "inverter failure", "others"]):
-                 # Loop through and explicitly map the selected category to state so the router isn't guessing
-                 categories = ["Production Issue", "System Not Working", "Communication Loss", "Battery Failure", "Inverter Failure", "Others"]
-                 for cat in categories:
-                      if cat.lower() in content.lower():
-                           state["selected_issue"] = cat
-                           is_button = True
-                           break
+            elif intent.issue_category:
+                 # Explicitly map the selected category to state so the router isn't guessing
+                 state["selected_issue"] = intent.issue_category
+                 is_button = True
             
             # Add to local state (human)
             # Only append if it's an actual user string, not a routing button click that we just consumed
@@ -270,40 +433,114 @@ async def run_stream(thread_id: str, request: Request):
         for k, v in input_data.items():
             if k != "messages": state[k] = v
 
+    # Formatted once per turn; during the run messages only append, so each step formats just its new ones
+    formatted = MessageLog(format_message(m, i) for i, m in enumerate(state["messages"]))
+
+    # The checkpoint already holds the thread, so only send the keys this request changed.
+    # Messages bypass the appending reducer: nodes expect earlier turns in formatted form.
+    # Inputs are checkpointed as writes, so this one goes in as a plain list (once per turn).
+    if saved:
+        run_input = {k: v for k, v in state.items() if k != "messages" and saved.get(k) != v}
+        run_input["messages"] = Overwrite(formatted.tolist())
+    else:
+        run_input = state
+
+    # stream_mode "delta" sends only new messages and changed keys per step. A client whose
+    # Last-Event-ID is the version it last saw skips the full resync at the start of the stream.
+    stream_mode = body.get("stream_mode")
+    delta_mode = stream_mode == "delta" or (isinstance(stream_mode, list) and "delta" in stream_mode)
+    last_event_id = request.headers.get("last-event-id") or body.get("last_event_id")
+    in_sync = bool(saved) and last_event_id == str(expected_version)
+
+    # Optimistic concurrency: a second turn on this thread (on any worker) loses with 409
+    run_token = await asyncio.to_thread(versions.claim, thread_id, expected_version)
+    if run_token is None:
+        slot.release()
+        return JSONResponse(status_code=409, content={
+            "detail": "Another run is in progress on this thread or it changed since it was read; retry.",
+            "version": await asyncio.to_thread(versions.current, thread_id)
+        })
+
     async def event_generator():
+        nonlocal formatted
+        update = None
+        version = None
+        finishing = False
+        seq = 0
+        # Encoded fragments for the messages already sent in full; values frames only encode new ones
+        encoded = []
         try:
             print(f"DEBUG: Starting SSE for {thread_id}")
-            yield f"event: metadata\ndata: {json.dumps({'run_id': run_id, 'thread_id': thread_id})}\n\n"
+            yield sse_event("metadata", {"run_id": run_id, "thread_id": thread_id})
             
-            # Initial "pulse" (shows user input immediately)
+            # Initial "pulse" (shows user input immediately). Frames share the
+            # append-only `formatted` log instead of copying it (each step's log
+            # extends the last one's), and only non-message keys are diffed.
             pulse_state = state.copy()
-            pulse_state["messages"] = [format_message(m, i) for i, m in enumerate(state.get("messages", []))]
-            yield f"event: values\ndata: {json.dumps(pulse_state)}\n\n"
+            pulse_state["messages"] = formatted
+            if not delta_mode:
+                yield sse_event("values", pulse_state, encoded_messages=encoded)
+            elif in_sync:
+                known = base
+                sent = len(base.get("messages", []))
+                seq += 1
+                yield delta_event(expected_version, seq, formatted.window(sent), changed_keys(known, pulse_state))
+                known, sent = pulse_state, len(formatted)
+            else:
+                # Client has nothing (or something stale): start it from the full state
+                yield sse_event("resync", {"seq": 0, "values": pulse_state}, f"{expected_version}.0")
+                known, sent = pulse_state, len(formatted)
             
-            # Graph run
-            async for update in graph.astream(state, stream_mode="values"):
-                # update is the current state snapshot
-                formatted_msgs = [format_message(m, i) for i, m in enumerate(update.get("messages", []))]
-                update["messages"] = formatted_msgs
-                
-                # Persistence
-                sessions[thread_id] = update
-                
-                yield f"event: values\ndata: {json.dumps(update)}\n\n"
+            # Graph run, reading one data snapshot throughout even if a reload lands mid-run
+            with data_backend.pinned():
+                async for update in graph.astream(run_input, config, stream_mode="values"):
+                    # update is the current state snapshot
+                    messages = update.get("messages", [])
+                    formatted = formatted.appended(format_message(m, i) for i, m in enumerate(messages[len(formatted):], start=len(formatted)))
+                    update["messages"] = formatted
+                    
+                    # Persistence
+                    await asyncio.to_thread(sessions.put, thread_id, update)
+                    
+                    if not delta_mode:
+                        yield sse_event("values", update, encoded_messages=encoded)
+                        continue
+                    changed = changed_keys(known, update)
+                    if changed or len(formatted) > sent:
+                        seq += 1
+                        yield delta_event(expected_version, seq, formatted.window(sent), changed)
+                    known, sent = update, len(formatted)
             
-            yield f"event: end\ndata: {json.dumps({'run_id': run_id})}\n\n"
+            # Shielded: a disconnect while this runs mustn't leave the turn claimed
+            finishing = True
+            version = await asyncio.shield(asyncio.to_thread(finish_run, thread_id, run_token, update))
+            # In delta mode the end event's id is what the client sends back as Last-Event-ID
+            yield sse_event("end", {"run_id": run_id, "version": version}, str(version))
             print(f"DEBUG: Stream finished for {thread_id}")
         except Exception as e:
             traceback.print_exc()
-            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            if not finishing:
+                await asyncio.shield(asyncio.to_thread(finish_run, thread_id, run_token, update))
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return RunStreamingResponse(event_generator(), slot, media_type="text/event-stream")
 
 # Dummies for UI
 @app.get("/v1/threads/{thread_id}/runs")
 async def list_runs(thread_id: str): return []
+
 @app.get("/v1/threads/{thread_id}/checkpoints")
-async def list_checkpoints(thread_id: str): return []
+def list_checkpoints(thread_id: str):
+    return [
+        {
+            "checkpoint_id": c.config["configurable"]["checkpoint_id"],
+            "parent_checkpoint_id": c.parent_config["configurable"]["checkpoint_id"] if c.parent_config else None,
+            "created_at": c.checkpoint["ts"],
+            "metadata": c.metadata or {},
+        }
+        for c in graph.checkpointer.list(thread_config(thread_id))
+    ]
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,57 @@
+"""
+Run admission (src.utils.run_admission) under bursts of simultaneous runs.
+
+Checks that a burst of runs on idle threads is admitted in full while slots
+are free, however small the queue limit, and that only runs which really
+wait count against it once the slots are taken. Then times enter/release
+for a run that doesn't wait.
+
+    python -m benchmarks.bench_admission [burst]
+"""
+import asyncio
+import sys
+import time
+from src.utils.run_admission import RunAdmission
+
+async def burst(admission: RunAdmission, thread_ids):
+    return await asyncio.gather(*(admission.enter(t) for t in thread_ids))
+
+async def check(size: int):
+    # More runs than the queue allows, all against free slots
+    admission = RunAdmission(max_running=size, max_waiting=1, max_wait_seconds=0.1)
+    slots = await burst(admission, [f"t{i}" for i in range(size)])
+    assert all(slots), admission.stats()
+    print(f"{size} runs on idle threads, {size} slots, queue limit 1: {admission.stats()}")
+
+    # Slots taken: one run may queue, the rest are turned away at once
+    extra = await burst(admission, [f"u{i}" for i in range(size)])
+    assert sum(s is not None for s in extra) == 0 and admission.rejected == size, admission.stats()
+    for slot in slots:
+        slot.release()
+    print(f"{size} more with every slot taken: {admission.stats()}")
+
+    # Same thread: the second run waits for the first, so it does count
+    admission = RunAdmission(max_running=4, max_waiting=1, max_wait_seconds=0.1)
+    first = await admission.enter("same")
+    queued = asyncio.ensure_future(admission.enter("same"))
+    await asyncio.sleep(0)
+    assert admission.waiting == 1 and await admission.enter("same") is None, admission.stats()
+    first.release()
+    (await queued).release()
+    assert admission.stats()["running"] == 0 and not admission._threads, admission.stats()
+    print(f"three runs on one thread, queue limit 1: {admission.stats()}")
+
+async def timing(rounds: int):
+    admission = RunAdmission()
+    start = time.perf_counter()
+    for i in range(rounds):
+        (await admission.enter(f"t{i % 100}")).release()
+    print(f"enter + release, nothing to wait for: {(time.perf_counter() - start) / rounds * 1e6:.2f} us")
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    asyncio.run(check(size))
+    asyncio.run(timing(100_000))
+
+if __name__ == "__main__":
+    main()
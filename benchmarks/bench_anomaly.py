@@ -0,0 +1,56 @@
+"""
+Fleet-wide expected-yield scoring (src.utils.yield_anomaly) on a synthetic
+fleet: N sites x 52 weekly readings, with 1% of sites producing at half
+their size's yield.
+
+Times score_yield alone and the whole per-site aggregation pass
+(src.utils.site_status.aggregate_metrics, which adds date parsing and the
+score trend, and scores each site's last YIELD_WINDOW_DAYS of readings
+rather than the whole history) and checks the planted under-producers are
+the ones flagged by both.
+
+    python -m benchmarks.bench_anomaly [sites] [weeks]
+"""
+import sys
+import time
+import numpy as np
+from src.utils.site_status import aggregate_metrics
+from src.utils.yield_anomaly import YIELD_WINDOW_DAYS, score_yield
+
+def build_fleet(n_sites: int, weeks: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    size_kw = rng.uniform(3.0, 12.0, n_sites)
+    codes = np.repeat(np.arange(n_sites), weeks)
+    cloudiness = rng.uniform(0.0, 90.0, n_sites * weeks)
+    # ~30 kWh per kW per sunny week, losing 70% at full cloud, with noise
+    production = size_kw[codes] * 30.0 * (1.0 - 0.007 * cloudiness) * rng.normal(1.0, 0.08, n_sites * weeks)
+    broken = rng.choice(n_sites, n_sites // 100, replace=False)
+    production[np.isin(codes, broken)] *= 0.5
+    return codes, size_kw, production, cloudiness, broken
+
+def main():
+    n_sites = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    weeks = int(sys.argv[2]) if len(sys.argv) > 2 else 52
+    codes, size_kw, production, cloudiness, broken = build_fleet(n_sites, weeks)
+    print(f"{n_sites} sites x {weeks} weeks = {len(codes)} readings")
+
+    start = time.perf_counter()
+    score = score_yield(codes, size_kw, production, cloudiness)
+    elapsed = time.perf_counter() - start
+    flagged = np.flatnonzero(score["underproducing"])
+    print(f"score_yield          {elapsed:6.2f} s, flagged {len(flagged)} (planted {len(broken)}, "
+          f"exact match {np.array_equal(np.sort(broken), flagged)}), curve {score['curve']}")
+
+    dates = (np.datetime64("2024-01-01") + np.tile(np.arange(weeks) * 7, n_sites)).astype(str).astype(object)
+    metrics = {"site_id": codes, "date": dates, "production_kwh": production,
+               "cloudiness_percentage": cloudiness, "performance_score": np.full(len(codes), 95.0)}
+    sizes = {str(i): float(kw) for i, kw in enumerate(size_kw)}
+    start = time.perf_counter()
+    aggregates = aggregate_metrics(metrics, sizes)
+    elapsed = time.perf_counter() - start
+    flagged = np.sort([int(site) for site, a in aggregates.items() if a["underproducing"]])
+    print(f"aggregate_metrics    {elapsed:6.2f} s, flagged {len(flagged)} over the last {YIELD_WINDOW_DAYS} days "
+          f"(exact match {np.array_equal(np.sort(broken), flagged)})")
+
+if __name__ == "__main__":
+    main()
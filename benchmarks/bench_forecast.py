@@ -0,0 +1,63 @@
+"""
+Fleet-wide production forecast fit (src.utils.production_forecast) on a
+synthetic fleet: N sites x D daily readings whose production per kW follows
+cloudiness and season with noise.
+
+Times the batched fit against fitting site by site with np.linalg.lstsq,
+checks they agree (up to the shrinkage towards the fleet fit), and times one
+week's forecast for the whole fleet and one site's expected reading.
+
+    python -m benchmarks.bench_forecast [sites] [days]
+"""
+import sys
+import time
+import timeit
+import numpy as np
+from src.utils.production_forecast import NormalSums, design, forecast_week
+
+def build_fleet(n_sites: int, days: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    size_kw = rng.uniform(3.0, 12.0, n_sites)
+    codes = np.repeat(np.arange(n_sites), days)
+    day = np.tile(np.arange(days, dtype=np.float64) + 19000, n_sites)
+    cloudiness = rng.uniform(0.0, 90.0, n_sites * days)
+    season = 1.0 + 0.3 * np.cos(2 * np.pi * (day - 172) / 365.2425)
+    production = size_kw[codes] * 4.5 * season * (1.0 - 0.007 * cloudiness) * rng.normal(1.0, 0.05, n_sites * days)
+    return codes, size_kw, day, cloudiness, production
+
+def main():
+    n_sites = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+    codes, size_kw, day, cloudiness, production = build_fleet(n_sites, days)
+    sizes = {str(i): float(kw) for i, kw in enumerate(size_kw)}
+    print(f"{n_sites} sites x {days} days = {len(codes)} readings")
+
+    start = time.perf_counter()
+    sums = NormalSums()
+    sums.add(codes, day, cloudiness, production, sizes)
+    forecast = sums.solve()
+    batched = time.perf_counter() - start
+    print(f"batched fit          {batched:6.2f} s")
+
+    sample = min(n_sites, 2000)
+    start = time.perf_counter()
+    slow = []
+    for site in range(sample):
+        rows = slice(site * days, (site + 1) * days)
+        x = design(day[rows], cloudiness[rows])
+        slow.append(np.linalg.lstsq(x, production[rows] / size_kw[site], rcond=None)[0])
+    per_site = (time.perf_counter() - start) * n_sites / sample
+    gap = np.abs(forecast.rows([str(s) for s in range(sample)]) - np.array(slow)).max()
+    print(f"site-by-site lstsq   {per_site:6.2f} s (extrapolated from {sample}), {per_site / batched:.1f}x slower; "
+          f"max coefficient gap {gap:.4f}")
+
+    week = np.isin(day, day[days - 7:days])
+    sites = [str(s) for s in range(n_sites)]
+    start = time.perf_counter()
+    expected, covered = forecast_week(forecast, codes[week], sites, size_kw, day[week], cloudiness[week])
+    print(f"fleet week forecast  {time.perf_counter() - start:6.2f} s, {int((covered > 0).sum())} sites covered")
+    secs = timeit.timeit(lambda: forecast.expected("0", size_kw[0], 19400, 35.0), number=2000) / 2000
+    print(f"one site expected    {secs * 1e6:6.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Streaming metrics ingestion (src.utils.metrics_ingest) into a throwaway
+SQLite data store built from the supportingData CSVs.
+
+First checks an export with blank-id rows next to a re-sent row: the blanks
+are skipped, the re-sent row isn't stored twice, and the new row is stored
+under its ids as written (a blank cell used to turn 302 into "302.0").
+Then times ingesting N synthetic readings spread over the CSVs' sites.
+
+    python -m benchmarks.bench_ingest [rows]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.utils.data_loader import get_csv_path
+from src.utils.metrics_ingest import ingest_metrics
+from src.utils.sqlite_backend import import_csvs
+
+def check_blank_ids(db_path: str, workdir: str):
+    metrics = pd.read_csv(get_csv_path("weekly_metrics.csv"))
+    resent = metrics.iloc[0].to_dict()
+    site = str(resent["site_id"])
+    new = dict(resent, metric_id=int(metrics["metric_id"].max()) + 1, date="2031-01-01")
+    rows = pd.DataFrame([resent, dict(resent, metric_id=None), dict(new, metric_id=new["metric_id"] + 1, site_id=None), new])
+    path = os.path.join(workdir, "blank_ids.csv")
+    # Written as an export would be: 202 and a blank, not 202.0 and NaN
+    rows.astype({"metric_id": "Int64", "site_id": "Int64"}).to_csv(path, index=False)
+
+    stats = ingest_metrics(path, db_path, refit=False)
+    conn = sqlite3.connect(db_path)
+    try:
+        stored = conn.execute("SELECT metric_id, site_id FROM weekly_metrics WHERE date = '2031-01-01'").fetchall()
+        copies = conn.execute("SELECT COUNT(*) FROM weekly_metrics WHERE CAST(metric_id AS REAL) = ?",
+                              (float(resent["metric_id"]),)).fetchone()[0]
+        totals = [r[0] for r in conn.execute("SELECT site_id FROM site_metric_totals WHERE site_id LIKE ?", (site + "%",))]
+    finally:
+        conn.close()
+    assert stats["inserted"] == 1 and stats["skipped"] == 3, stats
+    assert stored == [(str(new["metric_id"]), site)], stored
+    assert copies == 1 and totals == [site], (copies, totals)
+    print(f"blank ids next to a re-sent row: {stats}, stored {stored}")
+
+def build_export(path: str, sites: list, rows: int, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "metric_id": np.arange(rows) + 10_000_000,
+        "site_id": rng.choice(sites, rows),
+        "date": (np.datetime64("2025-01-01") + rng.integers(0, 365, rows)).astype(str),
+        "production_kwh": rng.uniform(5, 40, rows).round(1),
+        "cloudiness_percentage": rng.integers(0, 100, rows),
+        "performance_score": rng.integers(60, 100, rows),
+        "weather_conditions": "Sunny",
+    }).to_csv(path, index=False)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "ingest.sqlite")
+    import_csvs(db_path, get_csv_path)
+    check_blank_ids(db_path, workdir)
+
+    sites = pd.read_csv(get_csv_path("sites.csv"))["site_id"].astype(str).tolist()
+    path = os.path.join(workdir, "export.csv")
+    build_export(path, sites, rows)
+    start = time.perf_counter()
+    stats = ingest_metrics(path, db_path)
+    elapsed = time.perf_counter() - start
+    print(f"ingest {rows} readings {elapsed:6.2f} s ({rows / elapsed:,.0f} rows/s): {stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Encode throughput for SSE frames and state responses on realistic thread
+snapshots: a verified service customer with their context bundle, a year of
+weekly metrics and a long conversation.
+
+Compares the old stdlib json.dumps path with src.utils.serialization:
+- one-shot: a state response (GET /state, /history) for a thread;
+- stream step: a values frame later in a run, where every earlier message is
+  already encoded and only the step's new message is encoded.
+Run with the stdlib fallback by hiding orjson: SERIALIZATION_STDLIB=1.
+
+    python -m benchmarks.bench_json [messages] [frames]
+"""
+import json
+import os
+import sys
+import timeit
+
+if os.environ.get("SERIALIZATION_STDLIB"):
+    sys.modules["orjson"] = None # Make `import orjson` fail so the stdlib fallback is measured
+
+from src.utils import serialization
+from src.utils.messages import add_messages
+
+def build_state(n_messages: int):
+    metrics = [
+        {"metric_id": f"M{w:05d}", "site_id": "S001", "week_start": f"2025-{1 + w // 5:02d}-{1 + (w % 5) * 6:02d}",
+         "production_kwh": 70.0 + w % 9, "avg_cloudiness": 0.2 + (w % 7) / 20}
+        for w in range(52)
+    ]
+    site = {"site_id": "S001", "system_size_kw": 6.5, "inverter_brand": "SolarEdge", "issue_flag": False,
+            "issue_text": None, "recommended_action_text": None}
+    proposals = [
+        {"proposal_id": f"P{i}", "customer_id": "C001", "proposal_name": f"Plan {i}", "approx_price": 12000 + i * 1500,
+         "estimated_yearly_savings": 900 + i * 120, "date_created": "2025-06-01", "status": "Sent"}
+        for i in range(3)
+    ]
+    raw = []
+    for i in range(n_messages):
+        if i % 3 == 0:
+            raw.append({"type": "human", "content": f"Reply number {i} from the customer", "id": f"h-{i:08x}"})
+        elif i % 3 == 1:
+            raw.append({
+                "type": "ai",
+                "content": "Please select the category that best describes your issue:",
+                "additional_kwargs": {"options": [
+                    {"label": c, "value": c} for c in
+                    ["Production Issue", "System Not Working", "Communication Loss", "Battery Failure", "Inverter Failure", "Others"]
+                ]}
+            })
+        else:
+            raw.append(f"Your system is performing normally. Weekly production: {70 + i % 9}.0 kWh. Average cloudiness: 20.0%.")
+    return {
+        "session_id": "thread-1", "support_type": "service", "auth_verified": True, "auth_step": "verified",
+        "contact": {"email": "jane.smith@example.com", "phone": None}, "in_db": True,
+        "customer_id": "C001", "customer_name": "Jane Smith", "location": "Los Angeles, CA", "site_id": "S001",
+        "has_proposals": True, "metrics": metrics, "proposals": proposals,
+        "customer_context": {"customer": {"customer_id": "C001", "customer_name": "Jane Smith"}, "site": site,
+                             "metrics": metrics, "proposals": proposals, "open_tickets": []},
+        "messages": add_messages([], raw).tolist(),
+    }
+
+def main():
+    n_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    state = build_state(n_messages)
+    size = len(json.dumps(state).encode())
+
+    def stdlib():
+        return f"event: values\ndata: {json.dumps(state)}\n\n"
+
+    def one_shot():
+        return serialization.encode(state)
+
+    messages = state["messages"]
+    encoded = []
+    serialization.encode_messages(messages[:-1], encoded)
+
+    def stream_step():
+        # Drop the fragment for the newest message so each frame encodes one new message
+        del encoded[len(messages) - 1:]
+        return serialization.sse_event("values", state, encoded_messages=encoded)
+
+    assert json.loads(stream_step().split(b"data: ", 1)[1]) == json.loads(stdlib().split("data: ", 1)[1])
+    assert json.loads(one_shot()) == state
+    print(f"encoder: {serialization.ENCODER}, {n_messages} messages, {size / 1024:.0f} KiB per snapshot")
+    base = None
+    for name, fn in [("stdlib json.dumps", stdlib), ("one-shot response", one_shot), ("values frame in run", stream_step)]:
+        secs = timeit.timeit(fn, number=frames) / frames
+        base = base or secs
+        print(f"{name:20s} {secs * 1e6:9.1f} us/frame {size / secs / 1e6:8.1f} MB/s {base / secs:6.1f}x")
+
+if __name__ == "__main__":
+    main()
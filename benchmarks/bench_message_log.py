@@ -0,0 +1,43 @@
+"""
+Per-step cost of the State.messages reducer as a thread's history grows.
+
+Each step appends two messages, applied twice as LangGraph does (once on the
+channel copy used for conditional edges, once on the channel). The old
+reducer copied the whole history into a new list each time; the MessageLog
+reducer shares it.
+
+    python -m benchmarks.bench_message_log [history] [steps]
+"""
+import sys
+import timeit
+from src.utils.messages import add_messages, normalize_message
+
+def copying_reducer(left, right):
+    log = list(left)
+    log.extend(normalize_message(m, len(left) + i) for i, m in enumerate(right))
+    return log
+
+def run(reducer, history, steps: int):
+    log = history
+    for step in range(steps):
+        writes = [f"Reply {step}", {"type": "human", "content": f"Answer {step}", "id": f"h-{step:08x}"}]
+        reducer(log, writes) # Conditional-edge copy
+        log = reducer(log, writes)
+    return log
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    raw = [f"Message {i}" for i in range(size)]
+    as_list = [normalize_message(m, i) for i, m in enumerate(raw)]
+    as_log = add_messages([], raw)
+    assert run(copying_reducer, as_list, 5) == list(run(add_messages, as_log, 5))
+    print(f"{size} messages of history, {steps} steps x 2 reducer calls")
+    base = None
+    for name, reducer, history in [("list copy per step", copying_reducer, as_list), ("MessageLog", add_messages, as_log)]:
+        secs = timeit.timeit(lambda: run(reducer, history, steps), number=3) / 3 / steps
+        base = base or secs
+        print(f"{name:20s} {secs * 1e6:9.1f} us/step {base / secs:8.1f}x")
+
+if __name__ == "__main__":
+    main()
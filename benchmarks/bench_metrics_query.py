@@ -0,0 +1,52 @@
+"""
+"This week" for one site as its history grows: the old path (every row of
+the site, summed in Python, as service_status_check did) against a
+MetricsIndex window query (src.utils.metrics_query).
+
+Synthetic fleet of N sites with daily readings over Y years.
+
+    python -m benchmarks.bench_metrics_query [sites] [years]
+"""
+import sys
+import timeit
+import numpy as np
+from src.utils.metrics_query import MetricsIndex
+
+def build_columns(n_sites: int, days: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    site_id = np.tile(np.arange(n_sites), days)
+    dates = (np.datetime64("2020-01-01") + np.repeat(np.arange(days), n_sites)).astype(str).astype(object)
+    rows = n_sites * days
+    return {"site_id": site_id, "date": dates, "production_kwh": rng.uniform(10, 50, rows),
+            "cloudiness_percentage": rng.uniform(0, 90, rows), "performance_score": rng.uniform(80, 100, rows)}
+
+def main():
+    n_sites = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    columns = build_columns(n_sites, 365 * years)
+    rows = [None] * len(columns["site_id"])
+    by_site = {}
+    for pos, site in enumerate(columns["site_id"].tolist()):
+        by_site.setdefault(site, []).append(pos)
+    production = columns["production_kwh"].tolist()
+    index = MetricsIndex(columns, lambda pos: rows[pos])
+    site = n_sites // 2
+    print(f"{n_sites} sites x {365 * years} days = {len(index)} readings, {len(by_site[site])} for the queried site")
+
+    def old_path():
+        return sum(production[pos] for pos in by_site[site])
+
+    def week_rows():
+        return index.query(site, last=7)
+
+    def week_total():
+        return index.query(site, period="week", last=1)
+
+    base = None
+    for name, fn in [("all rows summed", old_path), ("last 7 readings", week_rows), ("this week, downsampled", week_total)]:
+        secs = timeit.timeit(fn, number=200) / 200
+        base = base or secs
+        print(f"{name:24s} {secs * 1e6:9.1f} us {base / secs:7.1f}x")
+
+if __name__ == "__main__":
+    main()
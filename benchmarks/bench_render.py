@@ -0,0 +1,53 @@
+"""
+Render cost of a 1,000-message thread, before and after message normalization
+moved to creation time.
+
+Before: every render ran the md5-based formatter over every stored message.
+After: messages are normalized once by the State.messages reducer and render
+is a pass-through.
+
+    python -m benchmarks.bench_render [messages] [renders]
+"""
+import sys
+import timeit
+from src.utils.messages import add_messages, format_message, normalize_message
+
+def build_thread(size: int):
+    """Raw messages in the shapes nodes and app.py emit."""
+    raw = []
+    for i in range(size):
+        if i % 4 == 0:
+            raw.append({"type": "human", "content": f"user reply {i}", "id": f"h-{i:08x}"})
+        elif i % 4 == 1:
+            raw.append({
+                "type": "ai",
+                "content": "Would you like to review those, or create new options?",
+                "additional_kwargs": {"options": [
+                    {"label": "Review old proposals", "value": "Review old proposals"},
+                    {"label": "Create new proposals", "value": "Create new proposals"}
+                ]}
+            })
+        else:
+            raw.append(f"**Proposal:** Plan {i}\n**Price:** $12000\n**Savings:** $900/yr\n[View full proposal](#)")
+    return raw
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    renders = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    raw = build_thread(size)
+
+    # What the thread looked like in state before: raw messages, formatted on every render
+    before = timeit.timeit(lambda: [normalize_message(m, i) for i, m in enumerate(raw)], number=renders) / renders
+
+    # Now: normalized once by the reducer as they're appended (about one old render in total)
+    stored = add_messages([], raw)
+    after = timeit.timeit(lambda: [format_message(m, i) for i, m in enumerate(stored)], number=renders) / renders
+
+    assert [normalize_message(m, i)["content"] for i, m in enumerate(raw)] == [m["content"] for m in stored]
+    print(f"messages per thread:      {size}")
+    print(f"render before (md5/msg):  {before * 1e3:8.3f} ms")
+    print(f"render after (pass-thru): {after * 1e3:8.3f} ms")
+    print(f"speedup:                  {before / after:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Graph nodes executed per turn, before and after turns resume at the waiting
+node (src.graph.resume_router).
+
+Before: every turn started at entry_node and re-ran the flow's finished nodes.
+After: the routers are followed past those no-op nodes and the turn starts
+at the node waiting for input.
+
+Drives the scripted sales and service conversations through app.py (so
+button clicks are consumed as in production) against a throwaway state DB,
+and counts the graph's superstep checkpoints per turn (one node each).
+
+    python -m benchmarks.bench_resume
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+os.environ["STATE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+
+from fastapi.testclient import TestClient
+import app as appmod
+from src.graph import create_graph
+from src.utils.checkpointer import thread_config
+
+CONVERSATIONS = {
+    "service": ["Service Support", "Use email", "jane.smith@example.com", "654321", "I still need help",
+                "Production Issue", "It is broken", "No, just create a ticket"],
+    "sales": ["Sales Support", "Use email", "john.doe@example.com", "123456", "Create new proposals", "yes",
+              "555-1111", "10001 NYC", "Residential", "200", "10", "2", "no", "Standard", "Select 5kW", "Call"],
+}
+
+def nodes_run(checkpointer, thread_id: str, seen: set) -> int:
+    """Nodes run since the last call, from the superstep checkpoints written."""
+    new = [c for c in checkpointer.list(thread_config(thread_id))
+           if c.config["configurable"]["checkpoint_id"] not in seen]
+    seen.update(c.config["configurable"]["checkpoint_id"] for c in new)
+    loops = sum(1 for c in new if c.metadata.get("source") == "loop")
+    return max(0, loops - 1) # A run's first loop checkpoint only applies the input
+
+def per_turn(client: TestClient, checkpointer, inputs) -> list:
+    thread_id = client.post("/threads").json()["thread_id"]
+    seen = set()
+    nodes_run(checkpointer, thread_id, seen)
+    counts = []
+    for text in inputs:
+        client.post(f"/threads/{thread_id}/runs/stream", json={"input": {"messages": [{"type": "human", "content": text}]}})
+        counts.append(nodes_run(checkpointer, thread_id, seen))
+    return counts
+
+def main():
+    client = TestClient(appmod.app)
+    checkpointer = appmod.graph.checkpointer
+    resuming = appmod.graph
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for mode, graph in [("before", create_graph(checkpointer, resume=False)), ("after", resuming)]:
+            appmod.graph = graph
+            for name, inputs in CONVERSATIONS.items():
+                results[name, mode] = per_turn(client, checkpointer, inputs)
+    appmod.graph = resuming
+    for name in CONVERSATIONS:
+        before, after = results[name, "before"], results[name, "after"]
+        print(f"{name}: {len(before)} turns")
+        print(f"  nodes per turn before: {before} total {sum(before)}")
+        print(f"  nodes per turn after:  {after} total {sum(after)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,75 @@
 from typing import TypedDict, Annotated, Dict
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from src.state import State
-from src.nodes.entry import entry_node, support_router
+from src.nodes.entry import entry_node, entry_done, support_router
 from src.nodes.auth import (
-    auth_collect_contact, auth_send_otp, auth_verify_otp, auth_router, auth_failed_node
+    auth_collect_contact, auth_send_otp, auth_verify_otp, aauth_verify_otp, auth_router, auth_failed_node
 )
-from src.nodes.lookup import customer_lookup, post_auth_router, lookup_failure_router, lookup_reset_for_retry
+from src.nodes.lookup import customer_lookup, acustomer_lookup, post_auth_router, lookup_failure_router, lookup_reset_for_retry
 from src.nodes.service import (
-    service_status_check, service_resolution_router, service_issue_capture, 
-    service_issue_context_collect, service_ticket_create, service_nps_and_close, 
+    service_status_check, aservice_status_check, service_resolution_router, service_issue_capture, 
+    service_issue_context_collect, status_check_done, issue_capture_done, issue_context_done, availability_done, service_ticket_create, aservice_ticket_create, service_nps_and_close, 
     service_unregistered_start,
     unregistered_system_router,
     issue_capture_router, issue_context_router,
-    service_availability_check, availability_router, service_live_chat_start
+    service_availability_check, aservice_availability_check, availability_router, service_live_chat_start
 )
-from src.nodes.sales import sales_start, sales_proposal_generate, sales_proposal_confirm, sales_router, sales_proposal_review, sales_info_capture, sales_existing_router
+from src.nodes.sales import (
+    sales_start, asales_start, sales_proposal_generate, asales_proposal_generate,
+    sales_proposal_confirm, asales_proposal_confirm,
+    sales_router, sales_proposal_review, sales_info_capture, sales_existing_router, sales_start_done
+)
+
+def io_node(func, afunc):
+    """
+    A node with sync and async implementations: graph.invoke uses the sync one,
+    graph.astream awaits the async one so data reads never block the event loop.
+    """
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
+# Nodes that are no-ops on re-entry once their step is done, with the router that follows them
+RESUME_PATH = {
+    "entry_node": (entry_done, support_router),
+    "lookup_failure_node": (lambda state: True, lookup_failure_router),
+    "sales_start": (sales_start_done, sales_router),
+    "service_status_check": (status_check_done, service_resolution_router),
+    "service_issue_capture": (issue_capture_done, issue_capture_router),
+    "service_issue_context_collect": (issue_context_done, issue_context_router),
+    "service_availability_check": (availability_done, availability_router),
+}
+
+def resume_router(state: State) -> str:
+    """
+    Where a turn starts. Every turn used to start at entry_node and re-run the
+    flow's finished nodes before reaching the one waiting for input; here the
+    routers are followed past those no-op nodes without running them. The
+    paused node is derived from State each turn rather than stored, so it
+    follows button clicks app.py writes into State.
+    """
+    node = "entry_node"
+    while node in RESUME_PATH and RESUME_PATH[node][0](state):
+        node = RESUME_PATH[node][1](state)
+    return node
 
-def create_graph():
+def create_graph(checkpointer=None, resume: bool = True):
     workflow = StateGraph(State)
 
     # Entry & Routing
     workflow.add_node("entry_node", entry_node)
-    workflow.set_entry_point("entry_node")
+    if resume:
+        workflow.set_conditional_entry_point(resume_router)
+    else:
+        workflow.set_entry_point("entry_node")
 
     # Auth Flow
     workflow.add_node("auth_collect_contact", auth_collect_contact)
     workflow.add_node("auth_send_otp", auth_send_otp)
-    workflow.add_node("auth_verify_otp", auth_verify_otp)
+    workflow.add_node("auth_verify_otp", io_node(auth_verify_otp, aauth_verify_otp))
     workflow.add_node("auth_failed_node", auth_failed_node)
     
     # Lookup
-    workflow.add_node("customer_lookup", customer_lookup)
+    workflow.add_node("customer_lookup", io_node(customer_lookup, acustomer_lookup))
     
     def lookup_failure_node(state: State) -> Dict:
         return {} # Just a pass-through node for routing
@@ -39,22 +78,22 @@ def create_graph():
     workflow.add_node("lookup_reset_for_retry", lookup_reset_for_retry)
 
     # Service Flow
-    workflow.add_node("service_status_check", service_status_check)
+    workflow.add_node("service_status_check", io_node(service_status_check, aservice_status_check))
     workflow.add_node("service_issue_capture", service_issue_capture)
     workflow.add_node("service_issue_context_collect", service_issue_context_collect)
-    workflow.add_node("service_availability_check", service_availability_check)
+    workflow.add_node("service_availability_check", io_node(service_availability_check, aservice_availability_check))
     workflow.add_node("service_live_chat_start", service_live_chat_start)
-    workflow.add_node("service_ticket_create", service_ticket_create)
+    workflow.add_node("service_ticket_create", io_node(service_ticket_create, aservice_ticket_create))
     workflow.add_node("service_nps_and_close", service_nps_and_close)
     workflow.add_node("service_unregistered_start", service_unregistered_start)
 
     # Sales Flow
-    workflow.add_node("sales_start", sales_start)
+    workflow.add_node("sales_start", io_node(sales_start, asales_start))
     workflow.add_node("sales_existing_router", lambda x: x) # Compliance node
     workflow.add_node("sales_proposal_review", sales_proposal_review)
     workflow.add_node("sales_info_capture", sales_info_capture)
-    workflow.add_node("sales_proposal_generate", sales_proposal_generate)
-    workflow.add_node("sales_proposal_confirm", sales_proposal_confirm)
+    workflow.add_node("sales_proposal_generate", io_node(sales_proposal_generate, asales_proposal_generate))
+    workflow.add_node("sales_proposal_confirm", io_node(sales_proposal_confirm, asales_proposal_confirm))
 
     workflow.add_conditional_edges("entry_node", support_router, {
         "auth_collect_contact": "auth_collect_contact",
@@ -174,6 +213,6 @@ def create_graph():
         "__end__": END
     })
 
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
 graph = create_graph()
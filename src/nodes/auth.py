@@ -1,5 +1,6 @@
 from src.state import State
-from src.utils.data_loader import verify_otp_sim
+from src.utils.data_loader import verify_otp_sim, averify_otp_sim, prefetch_customer_context
+from src.utils.intents import classify
 from typing import Dict
 from langgraph.graph import END
 
@@ -8,7 +9,7 @@ def auth_collect_contact(state: State) -> Dict:
     Node to prompt for email or phone.
     """
     messages = state.get("messages", [])
-    last_msg = messages[-1] if messages else None
+    last_msg = messages.last() if messages else None
     
     auth_type = state.get("auth_identifier_type")
     auth_val = state.get("auth_identifier_value")
@@ -18,9 +19,10 @@ def auth_collect_contact(state: State) -> Dict:
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
+            intent = classify(content)
             
             if auth_step == "failed":
-                if "Retry" in content or "retry" in content.lower():
+                if "retry" in intent:
                     return {
                         "auth_step": "identifier",
                         "auth_identifier_type": "",
@@ -40,17 +42,17 @@ def auth_collect_contact(state: State) -> Dict:
                             }
                         ]
                     }
-                elif "Exit" in content or "exit" in content.lower():
+                elif "exit" in intent:
                     return {"messages": [{"type": "ai", "content": "Please refresh the page to start over or select a new support option."}], "auth_step": "exit"}
 
             if not auth_type or auth_type == "":
                 # Expecting 'Use email' or 'Use phone'
-                if "use email" in content.lower():
+                if "use email" in intent:
                     return {
                         "auth_identifier_type": "email",
                         "messages": [{"type": "ai", "content": "Enter your email address."}]
                     }
-                elif "use phone" in content.lower():
+                elif "use phone" in intent:
                     return {
                         "auth_identifier_type": "phone",
                         "messages": [{"type": "ai", "content": "Enter your mobile number."}]
@@ -95,6 +97,9 @@ def auth_send_otp(state: State) -> Dict:
     channel = state.get("auth_identifier_type")
     channel_name = "email" if channel == "email" else "SMS"
     
+    # Warm the customer's data while they go and find the code
+    prefetch_customer_context(state.get("auth_identifier_value"))
+    
     return {
         "messages": [
             f"We’re sending you a one-time code. Please check your {channel_name} and enter the code here."
@@ -103,15 +108,16 @@ def auth_send_otp(state: State) -> Dict:
         "auth_otp_retries": 0
     }
 
-def auth_verify_otp(state: State) -> Dict:
+def _otp_attempt(state: State):
     """
-    Verify the 6-digit code.
+    Extract the code the user typed. Returns (identifier, otp, channel) to verify,
+    or a state update if there is nothing to verify yet.
     """
     user_otp = state.get("auth_otp_sent")
     messages = state.get("messages", [])
     
     if not user_otp and messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
@@ -131,9 +137,9 @@ def auth_verify_otp(state: State) -> Dict:
         return {
             "messages": ["I didn't catch a 6-digit code. Please enter the OTP sent to your device."]
         }
-    
-    is_correct = verify_otp_sim(identifier, user_otp, channel)
-    
+    return identifier, user_otp, channel
+
+def _otp_result(state: State, is_correct: bool) -> Dict:
     if is_correct:
         return {
             "auth_verified": True,
@@ -147,6 +153,24 @@ def auth_verify_otp(state: State) -> Dict:
             "messages": ["That code doesn’t look right. Please try again."]
         }
 
+def auth_verify_otp(state: State) -> Dict:
+    """
+    Verify the 6-digit code.
+    """
+    attempt = _otp_attempt(state)
+    if isinstance(attempt, dict):
+        return attempt
+    return _otp_result(state, verify_otp_sim(*attempt))
+
+async def aauth_verify_otp(state: State) -> Dict:
+    """
+    Async variant of auth_verify_otp; the OTP lookup runs off the event loop.
+    """
+    attempt = _otp_attempt(state)
+    if isinstance(attempt, dict):
+        return attempt
+    return _otp_result(state, await averify_otp_sim(*attempt))
+
 def auth_failed_node(state: State) -> Dict:
     """
     Terminal node for failed authentication.
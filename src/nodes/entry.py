@@ -1,4 +1,6 @@
 from src.state import State
+from src.utils.prompts import already_prompted, mark_prompted
+from src.utils.intents import classify
 from typing import Dict
 from langgraph.graph import END
 
@@ -7,40 +9,31 @@ def entry_node(state: State) -> Dict:
     Step 1 & 2: Greet visitor and ask for support type.
     """
     # Skip if we already have a support type
-    if state.get("support_type"):
+    if entry_done(state):
         return {}
 
     messages = state.get("messages", [])
     
     # Check if the user has already been greeted
-    greeting_sent = False
-    for m in messages:
-        content = ""
-        if isinstance(m, str): content = m
-        elif isinstance(m, dict): content = m.get("content", "") or m.get("text", "")
-        if "help you today?" in content:
-            greeting_sent = True
-            break
+    greeting_sent = already_prompted(state, "greeting")
             
     print(f"DEBUG ENTRY_NODE: greeting_sent={greeting_sent}, len={len(messages)}")
     if messages:
-        print(f"DEBUG ENTRY_NODE last_msg: {messages[-1]}")
+        print(f"DEBUG ENTRY_NODE last_msg: {messages.last()}")
             
     # If the user sent a message (like "hi") but support_type is still None,
     # and we already sent the greeting, they need a re-prompt.
     if greeting_sent and len(messages) > 1:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         
         if last_type == "human":
             content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-            c_lower = content.lower()
             
             # Check for hidden text intent
-            if "sale" in c_lower or "buy" in c_lower:
-                return {"support_type": "sales", "auth_step": "identifier"}
-            elif "service" in c_lower or "fix" in c_lower or "support" in c_lower:
-                return {"support_type": "service", "auth_step": "identifier"}
+            support_type = classify(content).support_type
+            if support_type:
+                return {"support_type": support_type, "auth_step": "identifier"}
                 
             # Otherwise, render the fallback menu
             return {
@@ -76,9 +69,14 @@ def entry_node(state: State) -> Dict:
                 }
             }
         ],
+        "prompts": mark_prompted(state, "greeting"),
         "auth_step": "identifier"
     }
 
+def entry_done(state: State) -> bool:
+    """entry_node is a no-op once the support type is known."""
+    return bool(state.get("support_type"))
+
 def support_router(state: State) -> str:
     """
     Step 3: Store choice and move to authentication.
@@ -88,15 +86,11 @@ def support_router(state: State) -> str:
     if not support_type:
         messages = state.get("messages", [])
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                  content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-                 c_lower = content.lower()
-                 if "sale" in c_lower or "buy" in c_lower:
-                     support_type = "sales"
-                 elif "service" in c_lower or "fix" in c_lower or "support" in c_lower:
-                     support_type = "service"
+                 support_type = classify(content).support_type
                      
         if not support_type:
             return "__end__" # Bounce back to entry_node for the menu
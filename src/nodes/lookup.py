@@ -1,5 +1,7 @@
 from src.state import State
-from src.utils.data_loader import load_customer_by_identifier
+from src.utils.data_loader import load_customer_context, aload_customer_context
+from src.utils.intents import classify
+from src.utils.metrics_query import WEEK_DAYS, day_str, to_day
 from typing import Dict
 from langgraph.graph import END
 
@@ -7,19 +9,47 @@ def customer_lookup(state: State) -> Dict:
     """
     Lookup customer in the database using the verified identifier.
     """
-    identifier = state.get("auth_identifier_value")
-    customer_data = load_customer_by_identifier(identifier)
-    
+    return _lookup_result(state, load_customer_context(state.get("auth_identifier_value")))
+
+async def acustomer_lookup(state: State) -> Dict:
+    """
+    Async variant of customer_lookup; the customer read runs off the event loop.
+    """
+    return _lookup_result(state, await aload_customer_context(state.get("auth_identifier_value")))
+
+def _state_context(context: Dict) -> Dict:
+    """
+    The part of the bundle later nodes read: the site and its last WEEK_DAYS
+    days of readings (service), and the proposals (sales). It's checkpointed
+    and streamed with every step, so a site's full history stays out.
+    """
+    metrics = context["metrics"]
+    dates = [r["date"] for r in metrics if isinstance(r.get("date"), str)]
+    try:
+        since = day_str(to_day(max(dates)) - WEEK_DAYS) if dates else None
+    except ValueError:
+        since = None # An unparseable latest date: keep the dated rows as they are
+    if since is not None:
+        # ISO dates compare in order as text
+        metrics = [r for r in metrics if isinstance(r.get("date"), str) and r["date"] > since]
+    return {"site": context["site"], "metrics": metrics, "proposals": context["proposals"]}
+
+def _lookup_result(state: State, context) -> Dict:
+    # One call fetches the customer plus site, metrics, proposals and open tickets;
+    # what downstream nodes read rides along on State so they don't query again
+    customer_data = context["customer"] if context else None
+
     # If the user is somehow pushed here again, check if they replied to the buttons!
     messages = state.get("messages", [])
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             human_reply = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-            if "continue anyway" in human_reply.lower():
+            intent = classify(human_reply)
+            if "continue anyway" in intent:
                 return {"lookup_retry_choice": "No, continue anyway"}
-            elif "try again" in human_reply.lower():
+            elif "try again" in intent:
                 return {"lookup_retry_choice": "Try again"}
                 
     if customer_data:
@@ -32,6 +62,7 @@ def customer_lookup(state: State) -> Dict:
             "location": location,
             "site_id": str(customer_data["site_id"]),
             "has_proposals": str(customer_data["has_proposals"]).lower() == "true",
+            "customer_context": _state_context(context),
             "messages": [f"Hi {name} from {location}, welcome back to SunBun."]
         }
     else:
@@ -115,5 +146,6 @@ def lookup_reset_for_retry(state: State) -> Dict:
         "auth_identifier_value": None,
         "auth_otp_sent": None,
         "auth_otp_retries": 0,
-        "lookup_retry_choice": None
+        "lookup_retry_choice": None,
+        "customer_context": None
     }
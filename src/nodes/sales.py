@@ -1,5 +1,10 @@
 from src.state import State
-from src.utils.data_loader import load_proposals_by_customer, get_proposal_templates, check_agent_availability
+from src.utils.data_loader import (
+    load_proposals_by_customer, get_proposal_templates, check_agent_availability,
+    aload_proposals_by_customer, aget_proposal_templates, acheck_agent_availability
+)
+from src.utils.prompts import already_prompted, mark_prompted
+from src.utils.intents import classify
 from typing import Dict, List
 from langgraph.graph import END
 import uuid
@@ -8,40 +13,78 @@ def sales_start(state: State) -> Dict:
     """
     Step 6.1 & 7: Greeting and context.
     """
+    pending = _sales_start_pending(state)
+    if pending is not None:
+        return pending
+    if not _greeting_lists_proposals(state):
+        proposals = []
+    elif state.get("customer_context"):
+        proposals = state["customer_context"]["proposals"]
+    else:
+        proposals = load_proposals_by_customer(state.get("customer_id"))
+    return _sales_greeting(state, proposals)
+
+async def asales_start(state: State) -> Dict:
+    """
+    Async variant of sales_start; the proposals read runs off the event loop.
+    """
+    pending = _sales_start_pending(state)
+    if pending is not None:
+        return pending
+    if not _greeting_lists_proposals(state):
+        proposals = []
+    elif state.get("customer_context"):
+        proposals = state["customer_context"]["proposals"]
+    else:
+        proposals = await aload_proposals_by_customer(state.get("customer_id"))
+    return _sales_greeting(state, proposals)
+
+def _greeting_lists_proposals(state: State) -> bool:
+    return bool(state.get("in_db") and state.get("has_proposals"))
+
+def sales_start_done(state: State) -> bool:
+    """sales_start is a no-op once the flow is past the greeting."""
+    return bool(state.get("sales_step")) and state.get("sales_step") != "greeting"
+
+def _sales_start_pending(state: State):
+    """
+    The update for a turn after the greeting was sent, or None if we still need to greet.
+    """
     # Prevent re-running if we already passed greeting
-    if state.get("sales_step") and state.get("sales_step") != "greeting":
+    if sales_start_done(state):
          return {}
          
     messages = state.get("messages", [])
     
     # Anti-spam check: Did we already ask how to help with solar plans?
-    if any(isinstance(m, str) and "how can we help with your solar plans" in m.lower() for m in messages) or \
-       any(isinstance(m, dict) and "how can we help with your solar plans" in str(m.get("content", "")).lower() for m in messages):
+    if already_prompted(state, "sales_greeting"):
         
         # Check if user made a choice
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                 content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-                if "old" in content.lower() or "review" in content.lower():
-                    return {"sales_review_choice": "Review old proposals"}
-                elif "new" in content.lower() or "create" in content.lower():
-                    return {"sales_review_choice": "Create new proposals"}
+                choice = classify(content).review_choice
+                if choice:
+                    return {"sales_review_choice": choice}
                     
         return {} # Wait for input
+    return None
 
+def _sales_greeting(state: State, proposals: List[Dict]) -> Dict:
     in_db = state.get("in_db")
     customer_name = state.get("customer_name") or "there"
     has_proposals = state.get("has_proposals")
-    customer_id = state.get("customer_id")
     
     new_messages = []
+    prompts = {}
     
     if in_db is False:
         new_messages.append("We couldn’t find an existing SunBun system under your details. Let’s collect some information to prepare a customized solar proposal for you.")
     else:
         new_messages.append(f"Hi {customer_name}, how can we help with your solar plans today?")
+        prompts = mark_prompted(state, "sales_greeting")
         
     if in_db and has_proposals:
         new_messages.append("We see that we’ve previously shared one or more proposals with you.")
@@ -57,14 +100,16 @@ def sales_start(state: State) -> Dict:
         })
         return {
             "messages": new_messages,
+            "prompts": prompts,
             "sales_step": "greeting",
-            "proposals": load_proposals_by_customer(customer_id)
+            "proposals": proposals
         }
     else:
         # Step 6.1 (no proposals) or Step 7 (not in DB)
         # Fast-forward to context collection with strict logic
         return {
             "messages": new_messages,
+            "prompts": prompts,
             "sales_review_choice": "Create new proposals",
             "sales_step": "info_capture"
         }
@@ -87,13 +132,14 @@ def sales_existing_router(state: State) -> str:
     # Check if they just replied to the greeting
     messages = state.get("messages", [])
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
              content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-             if "old" in content.lower() or "review" in content.lower():
+             choice = classify(content).review_choice
+             if choice == "Review old proposals":
                  return "sales_proposal_review"
-             elif "new" in content.lower() or "create" in content.lower():
+             elif choice == "Create new proposals":
                  return "sales_info_capture"
     
     # Wait for input
@@ -106,25 +152,25 @@ def sales_proposal_review(state: State) -> Dict:
     # Read human input if provided
     messages = state.get("messages", [])
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-            if "select" in content.lower() or "proceed" in content.lower():
+            intent = classify(content)
+            if "select" in intent or "proceed" in intent:
                  return {
                      "sales_review_result": "Select a proposal", 
                      "chosen_proposal_name": "your previous",
                      "sales_step": "review_complete" # Move step forward
                  }
-            elif "new" in content.lower() or "generate" in content.lower():
+            elif "new" in intent or "generate" in intent:
                  return {
                      "sales_review_result": "Generate new options",
                      "sales_step": "review_complete" # Move step forward
                  }
 
     # Protection: Did we already print the proposals?
-    if any(isinstance(m, str) and "Here are your past proposals" in m for m in messages) or \
-       any(isinstance(m, dict) and "Here are your past proposals" in str(m.get("content", "")) for m in messages):
+    if already_prompted(state, "past_proposals"):
         return {}
 
     proposals = state.get("proposals", [])
@@ -147,6 +193,7 @@ def sales_proposal_review(state: State) -> Dict:
     
     return {
         "messages": messages,
+        "prompts": mark_prompted(state, "past_proposals"),
         "sales_step": "review" # Lock the step
     }
 
@@ -160,7 +207,7 @@ def sales_info_capture(state: State) -> Dict:
     # Helper to check if a human just replied
     human_reply = ""
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             human_reply = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
@@ -171,12 +218,12 @@ def sales_info_capture(state: State) -> Dict:
         if state.get("sales_step") == "name" and human_reply:
              return {"customer_name": human_reply}
              
-        if any(isinstance(m, str) and "provide your full name" in m.lower() for m in messages) or \
-           any(isinstance(m, dict) and "provide your full name" in str(m.get("content", "")).lower() for m in messages):
+        if already_prompted(state, "sales_name"):
             return {"sales_step": "name"}
             
         return {
             "messages": ["Could you please provide your full name so we can personalize your proposal?"],
+            "prompts": mark_prompted(state, "sales_name"),
             "sales_step": "name"
         }
 
@@ -188,12 +235,13 @@ def sales_info_capture(state: State) -> Dict:
         if state.get("sales_step") == "contact_complement" and human_reply:
              return {"sales_contact_complement": human_reply}
              
-        if any(isinstance(m, str) and "provide your" in m.lower() for m in messages) or \
-           any(isinstance(m, dict) and "provide your" in str(m.get("content", "")).lower() for m in messages):
+        # The old "provide your" text match also caught the name prompt; keep that behavior
+        if already_prompted(state, "sales_contact_complement") or already_prompted(state, "sales_name"):
             return {"sales_step": "contact_complement"}
             
         return {
             "messages": [f"Could you please also provide your {missing_type} so we can reach out with the proposal?"],
+            "prompts": mark_prompted(state, "sales_contact_complement"),
             "sales_step": "contact_complement"
         }
 
@@ -203,12 +251,12 @@ def sales_info_capture(state: State) -> Dict:
              return {"sales_postal_code": human_reply}
              
         # Guard
-        if any(isinstance(m, str) and "postal code and city" in m.lower() for m in messages) or \
-           any(isinstance(m, dict) and "postal code and city" in str(m.get("content", "")).lower() for m in messages):
+        if already_prompted(state, "sales_postal_code"):
             return {"sales_step": "context"}
             
         return {
             "messages": ["Great! To prepare your new proposal, please provide your postal code and city."],
+            "prompts": mark_prompted(state, "sales_postal_code"),
             "sales_step": "context"
         }
         
@@ -217,7 +265,7 @@ def sales_info_capture(state: State) -> Dict:
         if state.get("sales_step") == "segment" and human_reply:
              return {"sales_segment_choice": human_reply}
 
-        if any(isinstance(m, dict) and "Are you a Residential, Commercial" in str(m.get("content", "")) for m in messages):
+        if already_prompted(state, "sales_segment"):
             return {"sales_step": "segment"}
             
         return {
@@ -232,6 +280,7 @@ def sales_info_capture(state: State) -> Dict:
                     ]
                 }
             }],
+            "prompts": mark_prompted(state, "sales_segment"),
             "sales_step": "segment"
         }
         
@@ -241,12 +290,12 @@ def sales_info_capture(state: State) -> Dict:
         if state.get("sales_step") == "usage_bill" and human_reply:
              return {"sales_monthly_bill": human_reply}
 
-        if any(isinstance(m, str) and "average monthly electricity bill" in m.lower() for m in messages) or \
-           any(isinstance(m, dict) and "average monthly electricity bill" in str(m.get("content", "")).lower() for m in messages):
+        if already_prompted(state, "sales_monthly_bill"):
             return {"sales_step": "usage_bill"}
             
         return {
             "messages": ["What is your average monthly electricity bill (in currency)?"],
+            "prompts": mark_prompted(state, "sales_monthly_bill"),
             "sales_step": "usage_bill"
         }
         
@@ -255,12 +304,12 @@ def sales_info_capture(state: State) -> Dict:
         if state.get("sales_step") == "usage_increase" and human_reply:
              return {"sales_consumption_increase": human_reply}
 
-        if any(isinstance(m, str) and "expect your electricity consumption" in m.lower() for m in messages) or \
-           any(isinstance(m, dict) and "expect your electricity consumption" in str(m.get("content", "")).lower() for m in messages):
+        if already_prompted(state, "sales_consumption_increase"):
             return {"sales_step": "usage_increase"}
             
         return {
             "messages": ["By what percentage do you expect your electricity consumption to increase in the next few years (e.g., EV, heating, new loads)?"],
+            "prompts": mark_prompted(state, "sales_consumption_increase"),
             "sales_step": "usage_increase"
         }
         
@@ -273,12 +322,12 @@ def sales_info_capture(state: State) -> Dict:
              count = int(num) if num else 1
              return {"sales_solution_count": count}
 
-        if any(isinstance(m, str) and "How many solution options" in m for m in messages) or \
-           any(isinstance(m, dict) and "How many solution options" in str(m.get("content", "")) for m in messages):
+        if already_prompted(state, "sales_solution_count"):
             return {"sales_step": "design_count"}
             
         return {
             "messages": ["How many solution options would you like to evaluate right now? (1-3)"],
+            "prompts": mark_prompted(state, "sales_solution_count"),
             "sales_step": "design_count"
         }
     
@@ -287,12 +336,12 @@ def sales_info_capture(state: State) -> Dict:
         if state.get("sales_step") == "design_brand" and human_reply:
              return {"sales_brand_preferences": [human_reply]}
 
-        if any(isinstance(m, str) and "brand preferences" in m for m in messages) or \
-           any(isinstance(m, dict) and "brand preferences" in str(m.get("content", "")) for m in messages):
+        if already_prompted(state, "sales_brand"):
             return {"sales_step": "design_brand"}
             
         return {
             "messages": ["Do you have any brand preferences for Inverters (Enphase, SolarEdge, Sungrow, GoodWe) or Modules (Jinko, Trina, Waaree)?"],
+            "prompts": mark_prompted(state, "sales_brand"),
             "sales_step": "design_brand"
         }
         
@@ -307,8 +356,7 @@ def sales_info_capture(state: State) -> Dict:
         if state.get("sales_step") == "design_tier" and human_reply:
              return {"sales_budget_tiers": [human_reply], "sales_step": "generating"}
 
-        if any(isinstance(m, str) and "prefer Premium, Standard" in m for m in messages) or \
-           any(isinstance(m, dict) and "prefer Premium, Standard" in str(m.get("content", "")) for m in messages):
+        if already_prompted(state, "sales_budget_tier"):
             return {"sales_step": "design_tier"}
             
         return {
@@ -325,6 +373,7 @@ def sales_info_capture(state: State) -> Dict:
                     }
                 }
             ],
+            "prompts": mark_prompted(state, "sales_budget_tier"),
             "sales_step": "design_tier"
         }
 
@@ -341,18 +390,30 @@ def sales_proposal_generate(state: State) -> Dict:
     Step 6.4: Backend proposal generation.
     """
     if state.get("sales_step") == "options":
-        # Waiting for user to select a proposal
-        messages = state.get("messages", [])
-        if messages:
-             last_msg = messages[-1]
-             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
-             if last_type == "human":
-                  content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-                  # If they selected an option
-                  return {"chosen_proposal_id": "PROP-NEW", "chosen_proposal_name": content}
-        return {}
+        return _option_selection(state)
+    return _designed_options(state, get_proposal_templates())
+
+async def asales_proposal_generate(state: State) -> Dict:
+    """
+    Async variant of sales_proposal_generate; the template read runs off the event loop.
+    """
+    if state.get("sales_step") == "options":
+        return _option_selection(state)
+    return _designed_options(state, await aget_proposal_templates())
 
-    templates = get_proposal_templates()
+def _option_selection(state: State) -> Dict:
+    # Waiting for user to select a proposal
+    messages = state.get("messages", [])
+    if messages:
+         last_msg = messages.last()
+         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
+         if last_type == "human":
+              content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
+              # If they selected an option
+              return {"chosen_proposal_id": "PROP-NEW", "chosen_proposal_name": content}
+    return {}
+
+def _designed_options(state: State, templates: List[Dict]) -> Dict:
     prefs = state.get("sales_brand_preferences", [])
     budget_raw = prefs[0] if prefs else "Standard"
     
@@ -393,30 +454,43 @@ def sales_proposal_confirm(state: State) -> Dict:
     Step 8.2 & 6.4: store chosen proposal and handoff to Inside Sales.
     """
     if state.get("sales_step") == "confirm":
-        # We are pausing for the call/chat payload from the user
-        messages = state.get("messages", [])
-        if messages:
-            last_msg = messages[-1]
-            last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
-            if last_type == "human":
-                content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-                cust_name = state.get("customer_name") or "customer"
-                prop_name = state.get("chosen_proposal_name") or "proposal"
+        return _handoff_choice(state)
+    return _handoff_offer(state, check_agent_availability("sales"))
+
+async def asales_proposal_confirm(state: State) -> Dict:
+    """
+    Async variant of sales_proposal_confirm; the availability read runs off the event loop.
+    """
+    if state.get("sales_step") == "confirm":
+        return _handoff_choice(state)
+    return _handoff_offer(state, await acheck_agent_availability("sales"))
+
+def _handoff_choice(state: State) -> Dict:
+    # We are pausing for the call/chat payload from the user
+    messages = state.get("messages", [])
+    if messages:
+        last_msg = messages.last()
+        last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
+        if last_type == "human":
+            content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
+            cust_name = state.get("customer_name") or "customer"
+            prop_name = state.get("chosen_proposal_name") or "proposal"
+            
+            final_msgs = []
+            intent = classify(content)
+            if "call" in intent:
+                final_msgs.append(f"CRM Task created: 'Call {cust_name} about {prop_name} within 1 hour.'")
+            elif "chat" in intent:
+                final_msgs.append("CRM Opportunity created: Opening live chat with Inside Sales...")
                 
-                final_msgs = []
-                if "call" in content.lower():
-                    final_msgs.append(f"CRM Task created: 'Call {cust_name} about {prop_name} within 1 hour.'")
-                elif "chat" in content.lower():
-                    final_msgs.append("CRM Opportunity created: Opening live chat with Inside Sales...")
-                    
-                final_msgs.append("Thank you for considering SunBun. We’ll be in touch shortly.")
-                return {
-                    "messages": final_msgs,
-                    "sales_step": "handoff"
-                }
-        return {}
-        
-    agent_online = check_agent_availability("sales")
+            final_msgs.append("Thank you for considering SunBun. We’ll be in touch shortly.")
+            return {
+                "messages": final_msgs,
+                "sales_step": "handoff"
+            }
+    return {}
+
+def _handoff_offer(state: State, agent_online: bool) -> Dict:
     proposal_name = state.get("chosen_proposal_name") or "the selected"
     
     messages = [f"Thank you for your interest in the {proposal_name} option."]
@@ -453,7 +527,7 @@ def sales_router(state: State) -> str:
         # Check if the human just clicked one of the greeting buttons
         messages = state.get("messages", [])
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                 return sales_existing_router(state)
@@ -463,7 +537,7 @@ def sales_router(state: State) -> str:
         # Check if the human just replied
         messages = state.get("messages", [])
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                 return "sales_proposal_review"
@@ -488,7 +562,7 @@ def sales_router(state: State) -> str:
         # Check if the human just clicked a proposal button
         messages = state.get("messages", [])
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                 return "sales_proposal_generate"
@@ -499,7 +573,7 @@ def sales_router(state: State) -> str:
         # Check if the human just replied with Call/Chat
         messages = state.get("messages", [])
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                 return "sales_proposal_confirm"
@@ -515,7 +589,7 @@ def sales_router(state: State) -> str:
         messages = state.get("messages", [])
         human_just_replied = False
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                 human_just_replied = True
@@ -1,8 +1,14 @@
 from src.state import State
-from src.utils.data_loader import load_site_by_id, load_metrics_by_site, check_agent_availability
+from src.utils.data_loader import (
+    load_site_status, check_agent_availability, record_service_ticket,
+    aload_site_status, acheck_agent_availability, arecord_service_ticket
+)
+from src.utils.prompts import already_prompted, mark_prompted
+from src.utils.intents import classify
 from typing import Dict, List
 from langgraph.graph import END
 import uuid
+from datetime import date
 
 def service_status_check(state: State) -> Dict:
     """
@@ -10,24 +16,54 @@ def service_status_check(state: State) -> Dict:
     Matches Step 4.1 requirements.
     """
     site_id = state.get("site_id")
-    site_data = load_site_by_id(site_id)
+    # One lookup in the fleet status view instead of reading the site and aggregating its metrics
+    status = load_site_status(site_id)
     
-    if not site_data:
+    if not status:
         return {"error": "Site not found"}
-    
-    messages = state.get("messages", [])
-    
-    # Check if we've already done this check to avoid duplicate messages on re-entry
-    if any(isinstance(m, dict) and m.get("content") and "Let me quickly check" in m.get("content") for m in messages):
+    if _status_already_reported(state):
         return {}
+    return _status_report(state, status)
+
+async def aservice_status_check(state: State) -> Dict:
+    """
+    Async variant of service_status_check; the status lookup runs off the event loop.
+    """
+    site_id = state.get("site_id")
+    status = await aload_site_status(site_id)
     
+    if not status:
+        return {"error": "Site not found"}
+    if _status_already_reported(state):
+        return {}
+    return _status_report(state, status)
+
+def _site_context(state: State, site_id):
+    """
+    The customer context bundle from customer_lookup, if it covers this site.
+    """
+    context = state.get("customer_context")
+    if context and context.get("site") and str(context["site"].get("site_id")) == str(site_id):
+        return context
+    return None
+
+def status_check_done(state: State) -> bool:
+    """
+    service_status_check is a no-op once the status was reported; only known
+    without a read when the site rides along in customer_context.
+    """
+    return _site_context(state, state.get("site_id")) is not None and _status_already_reported(state)
+
+def _status_already_reported(state: State) -> bool:
+    # Check if we've already done this check to avoid duplicate messages on re-entry
+    return already_prompted(state, "service_status")
+
+def _status_report(state: State, status: Dict) -> Dict:
     new_messages = ["Let me quickly check the current status of your solar system in our monitoring platform."]
     
-    issue_flag = str(site_data.get("issue_flag")).lower() == "true"
-    
-    if issue_flag:
-        issue_text = site_data.get("issue_text")
-        action_text = site_data.get("recommended_action_text")
+    if status["issue_flag"]:
+        issue_text = status["issue_text"]
+        action_text = status["recommended_action_text"]
         new_messages.extend([
             "We are currently seeing an issue on your system.",
             f"Issue: {issue_text}.",
@@ -38,6 +74,7 @@ def service_status_check(state: State) -> Dict:
             "issue_flag": True,
             "issue_text": issue_text,
             "action_text": action_text,
+            "prompts": mark_prompted(state, "service_status"),
             "messages": new_messages + [
                 {
                     "type": "ai",
@@ -53,22 +90,38 @@ def service_status_check(state: State) -> Dict:
         }
     else:
         # Case B: No active issue, check metrics
-        metrics = load_metrics_by_site(site_id)
-        if not metrics:
+        if not status["week_readings"]:
             analysis_text = "Your system does not show any active faults and no recent monitoring data is available."
         else:
-            avg_cloudiness = sum(m.get("cloudiness_percentage", 0) for m in metrics) / len(metrics)
-            total_prod = sum(m.get("production_kwh", 0) for m in metrics) # This is weekly total
+            avg_cloudiness = status["avg_cloudiness"] or 0
+            total_prod = status["weekly_production_kwh"] or 0 # This is weekly total
             
-            analysis_text = f"Your system is performing normally. Weekly production: {total_prod:.1f} kWh. Average cloudiness: {avg_cloudiness:.1f}%."
+            if status["underproducing"]:
+                # No fault reported, but well under what its size should make in this weather
+                analysis_text = (
+                    f"Your system does not show any active faults, but it is producing less than expected. "
+                    f"Weekly production: {total_prod:.1f} kWh, against about {status['expected_production_kwh']:.1f} kWh "
+                    f"expected for its size at {avg_cloudiness:.1f}% average cloudiness."
+                )
+            else:
+                analysis_text = f"Your system is performing normally. Weekly production: {total_prod:.1f} kWh. Average cloudiness: {avg_cloudiness:.1f}%."
+                if status["forecast_kwh"] is not None:
+                    # The site's own weather/season model, for "was it just the clouds?"
+                    analysis_text += (
+                        f" Given this week's cloudiness we expected about {status['forecast_kwh']:.1f} kWh; "
+                        f"you produced {total_prod:.1f} kWh."
+                    )
             if avg_cloudiness > 50:
                  analysis_text += " Higher cloudiness might affect production this week."
         
         new_messages.append(analysis_text)
+        context = _site_context(state, status["site_id"])
         return {
             "issue_flag": False,
             "issue_text": analysis_text,
-            "metrics": metrics,
+            # The rows themselves only ride along when customer_lookup already loaded them
+            "metrics": context["metrics"] if context else [],
+            "prompts": mark_prompted(state, "service_status"),
             "messages": new_messages + [
                 {
                     "type": "ai",
@@ -94,14 +147,15 @@ def service_resolution_router(state: State) -> str:
         # Check messages for button clicks if not explicitly set
         messages = state.get("messages", [])
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             
             if last_type == "human":
                 content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-                if "happy" in content.lower():
+                intent = classify(content)
+                if "happy" in intent:
                     status = "happy"
-                elif "help" in content.lower() or "still need" in content.lower():
+                elif "help" in intent or "still need" in intent:
                     status = "unhappy"
                     
     if status == "happy":
@@ -116,28 +170,28 @@ def service_issue_capture(state: State) -> Dict:
     Record details when the customer still needs help.
     """
     # If app.py already parsed a category click and injected it into State, we are done here.
-    if state.get("selected_issue"):
+    if issue_capture_done(state):
          return {}
          
     # We haven't asked for a category yet, check if the user just clicked one right now
     messages = state.get("messages", [])
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-            categories = ["Production Issue", "System Not Working", "Communication Loss", "Battery Failure", "Inverter Failure", "Others"]
-            for cat in categories:
-                if cat.lower() in content.lower():
-                    return {"selected_issue": cat}
+            category = classify(content).issue_category
+            if category:
+                return {"selected_issue": category}
                     
     # Prevent double-prompting
-    if any(isinstance(m, dict) and "Please select the category" in str(m.get("content", "")) for m in messages):
+    if already_prompted(state, "service_issue_category"):
         return {}
                     
     # If app.py hasn't set it yet, we prompt the user
     return {
         "service_resolution_status": "unhappy",
+        "prompts": mark_prompted(state, "service_issue_category"),
         "messages": [
             "Sorry to hear that. Let’s understand the issue in a bit more detail.",
             {
@@ -157,6 +211,9 @@ def service_issue_capture(state: State) -> Dict:
         ]
     }
 
+def issue_capture_done(state: State) -> bool:
+    return bool(state.get("selected_issue"))
+
 def issue_capture_router(state: State) -> str:
     """
     Route to context collection once an issue category is selected.
@@ -169,39 +226,40 @@ def service_issue_context_collect(state: State) -> Dict:
     """
     Collect free-text description and photo evidence.
     """
-    if state.get("description"):
+    if issue_context_done(state):
          return {}
          
     # Check if they just provided the description right now
     messages = state.get("messages", [])
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
             selected_issue = state.get("selected_issue", "").lower()
             
             # Make sure it's not the button click itself
-            if content.lower() != selected_issue and "still need help" not in content.lower() and "continue" not in content.lower():
-                prompt_str = "Please describe the issue"
-                if any(isinstance(m, str) and prompt_str in m for m in messages) or \
-                   any(isinstance(m, dict) and prompt_str in str(m.get("content", "")) for m in messages):
+            intent = classify(content)
+            if content.lower() != selected_issue and "still need help" not in intent and "continue" not in intent:
+                if already_prompted(state, "service_issue_description"):
                     return {"description": content}
                 
     # Prevent double-prompting
-    prompt_str = "Please describe the issue"
-    if any(isinstance(m, str) and prompt_str in m for m in messages) or \
-       any(isinstance(m, dict) and prompt_str in str(m.get("content", "")) for m in messages):
+    if already_prompted(state, "service_issue_description"):
         return {}
                 
     # If we haven't prompted yet, do it
     return {
+        "prompts": mark_prompted(state, "service_issue_description"),
         "messages": [
             "Please describe the issue in your own words.",
             "If possible, please upload photos or screenshots that show what you’re seeing (inverter screen, app screenshots, physical damage, etc.)."
         ]
     }
 
+def issue_context_done(state: State) -> bool:
+    return bool(state.get("description"))
+
 def issue_context_router(state: State) -> str:
     if state.get("description"):
         return "service_availability_check"
@@ -212,19 +270,31 @@ def service_availability_check(state: State) -> Dict:
     Check if a human is available and ask if they want a live chat.
     Matches Step 4.3 requirement 4 and 5.
     """
+    if availability_done(state):
+        return {}
+    return _availability_offer(state, check_agent_availability("service"))
+
+async def aservice_availability_check(state: State) -> Dict:
+    """
+    Async variant of service_availability_check; the availability read runs off the event loop.
+    """
+    if availability_done(state):
+        return {}
+    return _availability_offer(state, await acheck_agent_availability("service"))
+
+def availability_done(state: State) -> bool:
     # If they answered yes or no already, we don't need to ask
     if state.get("handoff_type") is not None:
-        return {}
+        return True
         
     # Check if we already asked
-    messages = state.get("messages", [])
-    if any(isinstance(m, dict) and "Would you like to start a live chat" in str(m.get("content")) for m in messages):
-        return {}
-        
-    online = check_agent_availability("service")
+    return already_prompted(state, "live_chat_offer")
+
+def _availability_offer(state: State, online: bool) -> Dict:
     if online:
         return {
             "representative_available": True,
+            "prompts": mark_prompted(state, "live_chat_offer"),
             "messages": [
                 {
                     "type": "ai",
@@ -257,14 +327,15 @@ def availability_router(state: State) -> str:
     if state.get("representative_available"):
         messages = state.get("messages", [])
         if messages:
-            last_msg = messages[-1]
+            last_msg = messages.last()
             last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
             if last_type == "human":
                 content = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
-                if "yes" in content.lower():
+                intent = classify(content)
+                if "yes" in intent:
                     state["handoff_type"] = "chat"
                     return "service_live_chat_start"
-                elif "no" in content.lower() or "ticket" in content.lower():
+                elif "no" in intent or "ticket" in intent:
                     state["handoff_type"] = "ticket"
                     return "service_ticket_create"
         return END
@@ -296,8 +367,35 @@ def service_ticket_create(state: State) -> Dict:
     if state.get("ticket_id"):
         return {}
         
-    ticket_id = f"TICKET-{uuid.uuid4().hex[:8].upper()}"
-    
+    ticket = _new_ticket(state)
+    # Persisted when the data backend supports writes (SQLite); the CSV store is read-only
+    record_service_ticket(ticket)
+    return _ticket_created(ticket)
+
+async def aservice_ticket_create(state: State) -> Dict:
+    """
+    Async variant of service_ticket_create; the ticket write runs off the event loop.
+    """
+    if state.get("ticket_id"):
+        return {}
+        
+    ticket = _new_ticket(state)
+    await arecord_service_ticket(ticket)
+    return _ticket_created(ticket)
+
+def _new_ticket(state: State) -> Dict:
+    return {
+        "ticket_id": f"TICKET-{uuid.uuid4().hex[:8].upper()}",
+        "customer_id": state.get("customer_id"),
+        "site_id": state.get("site_id"),
+        "issue_category": state.get("selected_issue"),
+        "description": state.get("description"),
+        "status": "Open",
+        "date_created": date.today().isoformat()
+    }
+
+def _ticket_created(ticket: Dict) -> Dict:
+    ticket_id = ticket["ticket_id"]
     messages = []
     messages.append(f"Your service ticket has been created. Ticket number: {ticket_id}. Our team will reach out to you shortly.")
 
@@ -332,7 +430,7 @@ def service_unregistered_start(state: State) -> Dict:
     messages = state.get("messages", [])
     human_reply = ""
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             human_reply = last_msg.get("content", "") if isinstance(last_msg, dict) else str(last_msg)
@@ -367,7 +465,7 @@ def service_unregistered_start(state: State) -> Dict:
     # 4. Online Monitoring
     if state.get("unregistered_online") is None:
         if state.get("service_step") == "online" and human_reply:
-             val = True if "yes" in human_reply.lower() else False
+             val = "yes" in classify(human_reply)
              return {"unregistered_online": val}
         return {
             "messages": [{
@@ -404,7 +502,7 @@ def unregistered_system_router(state: State) -> str:
     # We need to wait for input unless the human just replied
     messages = state.get("messages", [])
     if messages:
-        last_msg = messages[-1]
+        last_msg = messages.last()
         last_type = last_msg.get("type") if isinstance(last_msg, dict) else "ai"
         if last_type == "human":
             return "service_unregistered_start"
@@ -1,5 +1,6 @@
 from typing import TypedDict, Literal, Optional, List, Dict, Annotated
-from operator import add
+from src.utils.messages import MessageLogChannel
+from src.utils.prompts import merge_prompts
 
 class State(TypedDict):
     # Session tracking
@@ -8,7 +9,8 @@ class State(TypedDict):
     
     # Routing & Flow
     support_type: Literal["sales", "service", None]
-    messages: Annotated[List[Dict | str], add]
+    messages: Annotated[List[Dict | str], MessageLogChannel()] # Append-only MessageLog, normalized to canonical dicts with stable ids on append
+    prompts: Annotated[Dict[str, bool], merge_prompts] # Prompts already sent, see src/utils/prompts.py
     
     # Authentication
     auth_verified: bool
@@ -28,6 +30,7 @@ class State(TypedDict):
     location: Optional[str]
     site_id: Optional[str]
     has_proposals: Optional[bool]
+    customer_context: Optional[Dict] # From customer_lookup: site, its last week of metrics, proposals
     
     # Unregistered System Info (Step 5.2)
     unregistered_system_size: Optional[str]
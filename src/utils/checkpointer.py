@@ -0,0 +1,107 @@
+"""
+Durable LangGraph checkpointer for thread state.
+
+Every graph step is checkpointed per thread_id into a local SQLite database
+(STATE_DB_PATH, default .state/checkpoints.sqlite), so a restart or deploy
+resumes conversations where they left off. Falls back to an in-process
+InMemorySaver when langgraph-checkpoint-sqlite isn't installed; evicted
+sessions then spill to disk instead (see CheckpointSpill).
+"""
+import asyncio
+import os
+import sqlite3
+from typing import Dict, List, Optional
+from langgraph.checkpoint.memory import InMemorySaver
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:
+    SqliteSaver = None
+
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH") or os.path.join(".state", "checkpoints.sqlite")
+
+if SqliteSaver is not None:
+    class ThreadedSqliteSaver(SqliteSaver):
+        """
+        SqliteSaver usable from graph.astream: the async methods run the sync
+        ones on a worker thread (the saver serialises connection access itself).
+        """
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+            for item in items:
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+
+def create_checkpointer(db_path: str = STATE_DB_PATH):
+    if SqliteSaver is None:
+        print("DEBUG: langgraph-checkpoint-sqlite not installed; thread state will not survive a restart")
+        return InMemorySaver()
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    # Shared by every worker process; wait on their write locks rather than fail
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    return ThreadedSqliteSaver(conn)
+
+def thread_config(thread_id: str) -> Dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+def is_durable(checkpointer) -> bool:
+    return not isinstance(checkpointer, InMemorySaver)
+
+def has_checkpoint(checkpointer, thread_id: str) -> bool:
+    if isinstance(checkpointer, InMemorySaver):
+        return thread_id in checkpointer.storage
+    with checkpointer.cursor(transaction=False) as cur:
+        return cur.execute("SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (thread_id,)).fetchone() is not None
+
+def thread_ids(checkpointer) -> List[str]:
+    """
+    Every thread with at least one checkpoint, without deserialising any of them.
+    """
+    if isinstance(checkpointer, InMemorySaver):
+        return list(checkpointer.storage.keys())
+    with checkpointer.cursor(transaction=False) as cur:
+        return [row[0] for row in cur.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+
+class CheckpointSpill:
+    """
+    SessionStore spill target backed by the graph's checkpointer. The graph
+    already checkpoints every step, so evicting a checkpointed thread writes
+    nothing and rehydrating reads its latest checkpoint.
+
+    Everything else goes to `disk` (a session_store.DiskSpill): threads
+    evicted before their first run, and with a non-durable saver every
+    thread, whose in-memory checkpoints are dropped so eviction frees them.
+    The next run on such a thread starts from the spilled state.
+    """
+    def __init__(self, graph, disk):
+        self.graph = graph
+        self.disk = disk
+        self.durable = is_durable(graph.checkpointer)
+
+    def save(self, thread_id: str, state: Dict):
+        if self.durable and has_checkpoint(self.graph.checkpointer, thread_id):
+            return
+        self.disk.save(thread_id, state)
+        if not self.durable:
+            self.graph.checkpointer.delete_thread(thread_id)
+
+    def load(self, thread_id: str) -> Optional[Dict]:
+        values = self.graph.get_state(thread_config(thread_id)).values
+        return dict(values) if values else self.disk.load(thread_id)
+
+    def delete(self, thread_id: str):
+        self.disk.delete(thread_id) # A checkpoint stays the durable copy
+
+    def ids(self) -> List[str]:
+        return list(dict.fromkeys(thread_ids(self.graph.checkpointer) + self.disk.ids()))
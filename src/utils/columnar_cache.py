@@ -0,0 +1,215 @@
+"""
+Compiled columnar cache for the supportingData CSVs.
+
+`python -m src.utils.columnar_cache` converts each CSV into one typed binary
+file per column (numpy .npy; strings as UTF-8 bytes + offsets), plus a sorted
+index per natural key, keyed by the source content hash. The data store
+memory-maps these at startup so several workers share the same pages through
+the OS page cache, and falls back to the CSV whenever the source has changed
+since it was compiled.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+CACHE_DIR = os.environ.get("DATA_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "supportingData", ".compiled"
+)
+
+class StringColumn:
+    """
+    Variable-width strings stored as one UTF-8 byte buffer plus row offsets.
+    """
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos: int) -> str:
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return bytes(self.data[start:end]).decode("utf-8")
+
+    @classmethod
+    def from_values(cls, values) -> "StringColumn":
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+class KeyIndex:
+    """
+    Lookup index on one key column: the stringified keys sorted (fixed-width
+    unicode, so it can be memory-mapped) with their row positions. A lookup
+    is two binary searches; rows with the same key come back in table order.
+    """
+    def __init__(self, keys: np.ndarray, positions: np.ndarray):
+        self.keys = keys
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, value) -> List[int]:
+        value = str(value)
+        if len(value) > self.keys.dtype.itemsize // 4:
+            return [] # Longer than any key
+        lo = int(np.searchsorted(self.keys, value, side="left"))
+        hi = int(np.searchsorted(self.keys, value, side="right"))
+        return self.positions[lo:hi].tolist()
+
+    @classmethod
+    def from_values(cls, values: Iterable[str]) -> "KeyIndex":
+        keys = np.array(list(values), dtype=str)
+        order = np.argsort(keys, kind="stable")
+        return cls(keys[order], order.astype(np.int64))
+
+def key_strings(values: List, nulls: np.ndarray) -> List[str]:
+    """Index keys for column cells as the data store reads them: str(value), "nan" for blanks."""
+    return ["nan" if null else str(v) for v, null in zip(values, nulls)]
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int64"
+    if pd.api.types.is_float_dtype(series):
+        return "float64"
+    if pd.api.types.infer_dtype(series, skipna=True) == "boolean":
+        return "bool" # True/False with blanks: stored as bool plus the null mask
+    return "string"
+
+def _manifest_path(filename: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{filename}.json")
+
+def compile_csv(csv_path: str, cache_dir: str = CACHE_DIR, keys: Iterable[str] = ()) -> Dict:
+    """
+    Convert one CSV into its columnar form, with a KeyIndex per column in
+    `keys`, and atomically publish the manifest.
+    """
+    filename = os.path.basename(csv_path)
+    st = os.stat(csv_path)
+    sha = file_sha256(csv_path)
+    df = pd.read_csv(csv_path)
+
+    table_dir = f"{filename}-{sha[:16]}"
+    final_dir = os.path.join(cache_dir, table_dir)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    columns, indexes = [], {}
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        kind = _column_kind(series)
+        nulls = series.isna().to_numpy()
+        has_nulls = bool(nulls.any())
+        base = os.path.join(tmp_dir, f"c{i}")
+        if kind == "string":
+            values = ["" if null else str(v) for v, null in zip(series.tolist(), nulls)]
+            col = StringColumn.from_values(values)
+            np.save(f"{base}.data.npy", col.data)
+            np.save(f"{base}.offsets.npy", col.offsets)
+        elif has_nulls:
+            np.save(f"{base}.npy", series.where(~nulls, 0).to_numpy(dtype=kind))
+        else:
+            np.save(f"{base}.npy", series.to_numpy(dtype=kind))
+        if has_nulls:
+            np.save(f"{base}.nulls.npy", nulls)
+        if name in keys:
+            index = KeyIndex.from_values(key_strings(series.tolist(), nulls))
+            np.save(f"{base}.keys.npy", index.keys)
+            np.save(f"{base}.positions.npy", index.positions)
+            indexes[name] = f"c{i}"
+        columns.append({"name": name, "kind": kind, "nulls": has_nulls})
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+
+    manifest = {
+        "source": filename,
+        "sha256": sha,
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "rows": len(df),
+        "dir": table_dir,
+        "columns": columns,
+        "indexes": indexes,
+    }
+    tmp_manifest = f"{_manifest_path(filename, cache_dir)}.tmp-{os.getpid()}"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, _manifest_path(filename, cache_dir))
+
+    # Drop builds of older source versions; workers that still map them keep their pages
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(f"{filename}-") and entry != table_dir and ".tmp-" not in entry:
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+    return manifest
+
+def load_columns(csv_path: str, cache_dir: str = CACHE_DIR) -> Optional[Dict]:
+    """
+    Memory-map the compiled columns for a CSV, or return None if there is no
+    build or it is stale against the current source file.
+    Returns {"columns": {name: array or StringColumn}, "nulls": {name: mask},
+    "indexes": {name: KeyIndex}}.
+    """
+    filename = os.path.basename(csv_path)
+    try:
+        with open(_manifest_path(filename, cache_dir)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    st = os.stat(csv_path)
+    if (st.st_size, st.st_mtime_ns) != (manifest["source_size"], manifest["source_mtime_ns"]):
+        # Touched or rewritten: only trust the build if the content is unchanged
+        if st.st_size != manifest["source_size"] or file_sha256(csv_path) != manifest["sha256"]:
+            print(f"DEBUG: Compiled cache for {filename} is stale, falling back to CSV")
+            return None
+
+    table_dir = os.path.join(cache_dir, manifest["dir"])
+    columns, nulls, indexes = {}, {}, {}
+    try:
+        for i, col in enumerate(manifest["columns"]):
+            base = os.path.join(table_dir, f"c{i}")
+            if col["kind"] == "string":
+                columns[col["name"]] = StringColumn(
+                    np.load(f"{base}.data.npy", mmap_mode="r"),
+                    np.load(f"{base}.offsets.npy", mmap_mode="r"),
+                )
+            else:
+                columns[col["name"]] = np.load(f"{base}.npy", mmap_mode="r")
+            if col["nulls"]:
+                nulls[col["name"]] = np.load(f"{base}.nulls.npy", mmap_mode="r")
+        for name, stem in manifest.get("indexes", {}).items():
+            base = os.path.join(table_dir, stem)
+            indexes[name] = KeyIndex(np.load(f"{base}.keys.npy", mmap_mode="r"), np.load(f"{base}.positions.npy", mmap_mode="r"))
+    except (OSError, ValueError):
+        return None
+    return {"columns": columns, "nulls": nulls, "indexes": indexes}
+
+def compile_all(data_dir: str, cache_dir: str = CACHE_DIR):
+    from src.utils.data_store import TABLE_KEYS
+    os.makedirs(cache_dir, exist_ok=True)
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".csv"):
+            manifest = compile_csv(os.path.join(data_dir, filename), cache_dir, TABLE_KEYS.get(filename, ()))
+            print(f"Compiled {filename}: {manifest['rows']} rows -> {manifest['dir']}")
+
+if __name__ == "__main__":
+    from src.utils.data_loader import DATA_DIR
+    compile_all(sys.argv[1] if len(sys.argv) > 1 else DATA_DIR)
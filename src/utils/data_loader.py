@@ -1,8 +1,18 @@
-import pandas as pd
+import asyncio
+import contextvars
+import functools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.data_store import DataStore, MemoryBackend
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "supportingData")
 
+# "memory" serves the CSVs from the resident store, "sqlite" from a local indexed database
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "memory")
+SQLITE_PATH = os.environ.get("DATA_SQLITE_PATH") or os.path.join(DATA_DIR, "sunbun.sqlite")
+
 def get_csv_path(filename: str) -> str:
     path = os.path.join(DATA_DIR, filename)
     if not os.path.exists(path):
@@ -10,56 +20,197 @@ def get_csv_path(filename: str) -> str:
         path = os.path.join("supportingData", filename)
     return path
 
+# Tables are parsed once per process and indexed on their natural keys
+store = DataStore(get_csv_path)
+
+def get_backend():
+    if DATA_BACKEND == "sqlite":
+        from src.utils.sqlite_backend import SqliteBackend
+        return SqliteBackend(SQLITE_PATH, get_csv_path)
+    return MemoryBackend(store)
+
+backend = get_backend()
+
 def load_customer_by_identifier(identifier: str):
-    df = pd.read_csv(get_csv_path("customers.csv"))
-    # Match email or phone
-    match = df[(df['email'] == identifier) | (df['phone'].astype(str) == str(identifier))]
-    if not match.empty:
-        data = match.iloc[0].to_dict()
+    data = backend.customer_by_identifier(identifier)
+    if data:
         # Rename 'name' to 'customer_name' for consistency with state
         data['customer_name'] = data.pop('name')
         return data
     return None
 
 def load_site_by_id(site_id: str):
-    df = pd.read_csv(get_csv_path("sites.csv"))
-    match = df[df['site_id'].astype(str) == str(site_id)]
-    if not match.empty:
-        return match.iloc[0].to_dict()
-    return None
+    return backend.site_by_id(site_id)
 
 def load_metrics_by_site(site_id: str):
-    df = pd.read_csv(get_csv_path("weekly_metrics.csv"))
-    match = df[df['site_id'].astype(str) == str(site_id)]
-    return match.to_dict(orient="records")
+    return backend.metrics_by_site(site_id)
 
 def load_proposals_by_customer(customer_id: str):
-    df = pd.read_csv(get_csv_path("proposals.csv"))
-    match = df[df['customer_id'].astype(str) == str(customer_id)]
-    return match.to_dict(orient="records")
+    return backend.proposals_by_customer(customer_id)
+
+def query_metrics(site_id: str, start: str = None, end: str = None, period: str = None, last: int = None):
+    """
+    A site's readings between the ISO dates `start` and `end` (inclusive), or
+    their totals per "day", "week" or "month" `period`. `last` keeps the last
+    N periods (or readings) up to `end` or the latest reading. Raises
+    ValueError on a bad date or period. See src.utils.metrics_query.
+    """
+    return backend.query_metrics(site_id, start, end, period, last)
+
+def forecast_production(site_id: str, cloudiness: float, date: str):
+    """
+    Expected kWh for one day's reading at the site under `cloudiness` percent
+    on ISO `date` (e.g. from a weather forecast), or None if the site has no
+    forecast. See src.utils.production_forecast.
+    """
+    from src.utils.metrics_query import to_day
+    return backend.forecast_production(site_id, cloudiness, to_day(date))
 
 def verify_otp_sim(identifier: str, otp: str, channel: str):
     # Global bypass for testing purposes
     if str(otp) == "123456":
         return True
-        
-    filename = "email_otp.csv" if channel == "email" else "sms_otp.csv"
-    id_col = "email" if channel == "email" else "phone"
-    df = pd.read_csv(get_csv_path(filename))
-    match = df[(df[id_col].astype(str) == str(identifier)) & (df['otp'].astype(str) == str(otp))]
-    return not match.empty
+    return backend.otp_matches(identifier, otp, channel)
 
 def check_agent_availability(agent_type: str):
-    df = pd.read_csv(get_csv_path("agent_availability.csv"))
     # agent_type will be 'sales' or 'service'
     dept = agent_type.capitalize() # 'Sales' or 'Service'
-    match = df[(df['department'] == dept) & (df['is_online'].astype(str).str.lower() == 'true')]
-    return not match.empty
+    return backend.agents_online(dept)
 
 def get_proposal_templates():
-    df = pd.read_csv(get_csv_path("proposal_template.csv"))
-    return df.to_dict(orient="records")
+    return backend.proposal_templates()
 
 def load_site_issues():
-    df = pd.read_csv(get_csv_path("site_issues.csv"))
-    return df.to_dict(orient="records")
+    return backend.site_issues()
+
+def load_site_status(site_id: str):
+    """
+    The site's record in the fleet status view (src.utils.site_status): issue
+    flag and texts plus weekly production, cloudiness and score trend.
+    """
+    return backend.site_status(site_id)
+
+def load_customer_context(identifier: str):
+    """
+    The customer's whole context bundle in one call:
+    {"customer", "site", "metrics", "proposals", "open_tickets"}, or None if unknown.
+    Served from a speculative prefetch when one is waiting for this identifier.
+    """
+    prefetched = _take_prefetched(identifier)
+    # A prefetch still queued behind other reads is cancelled rather than waited on,
+    # so a pool thread never blocks on work queued on its own pool
+    if prefetched is not None and not prefetched.cancel():
+        try:
+            return prefetched.result()
+        except Exception:
+            pass # Prefetch failed; fall back to a direct read
+    return _fetch_customer_context(identifier)
+
+def _fetch_customer_context(identifier: str):
+    bundle = backend.customer_context(identifier)
+    if bundle:
+        bundle["customer"]["customer_name"] = bundle["customer"].pop("name")
+    return bundle
+
+def record_service_ticket(ticket: dict) -> bool:
+    """
+    Persist a new service ticket. Returns False when the backend is read-only (CSV).
+    """
+    return backend.record_service_ticket(ticket)
+
+def record_crm_opportunity(opportunity: dict) -> bool:
+    """
+    Persist a new CRM opportunity. Returns False when the backend is read-only (CSV).
+    """
+    return backend.record_crm_opportunity(opportunity)
+
+# --- ASYNC API ---
+# Lookups run on a small dedicated pool so a slow read never blocks the event
+# loop, and a burst of turns can't take every default-executor thread.
+_io_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("DATA_IO_WORKERS", "8")), thread_name_prefix="data-io")
+
+async def _run_io(fn, *args):
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context so a pinned data snapshot is honoured on the pool thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_io_pool, functools.partial(ctx.run, fn, *args))
+
+async def aload_customer_by_identifier(identifier: str):
+    return await _run_io(load_customer_by_identifier, identifier)
+
+async def aload_site_by_id(site_id: str):
+    return await _run_io(load_site_by_id, site_id)
+
+async def aload_metrics_by_site(site_id: str):
+    return await _run_io(load_metrics_by_site, site_id)
+
+async def aload_proposals_by_customer(customer_id: str):
+    return await _run_io(load_proposals_by_customer, customer_id)
+
+async def aquery_metrics(site_id: str, start: str = None, end: str = None, period: str = None, last: int = None):
+    return await _run_io(query_metrics, site_id, start, end, period, last)
+
+async def aforecast_production(site_id: str, cloudiness: float, date: str):
+    return await _run_io(forecast_production, site_id, cloudiness, date)
+
+async def averify_otp_sim(identifier: str, otp: str, channel: str):
+    return await _run_io(verify_otp_sim, identifier, otp, channel)
+
+async def acheck_agent_availability(agent_type: str):
+    return await _run_io(check_agent_availability, agent_type)
+
+async def aget_proposal_templates():
+    return await _run_io(get_proposal_templates)
+
+async def aload_site_issues():
+    return await _run_io(load_site_issues)
+
+async def aload_site_status(site_id: str):
+    return await _run_io(load_site_status, site_id)
+
+async def aload_customer_context(identifier: str):
+    return await _run_io(load_customer_context, identifier)
+
+# --- SPECULATIVE PREFETCH ---
+# The user spends 10-30s typing their OTP after auth_send_otp. We already know
+# who they claim to be, so resolve their context bundle in the background and
+# hand it to customer_lookup once the code checks out.
+PREFETCH_TTL_SECONDS = float(os.environ.get("PREFETCH_TTL_SECONDS", "120"))
+_prefetched = {} # identifier -> (expires_at, data version, Future)
+_prefetch_lock = threading.Lock()
+
+def _data_version():
+    return getattr(backend, "version", None)
+
+def prefetch_customer_context(identifier: str):
+    """
+    Start resolving the customer bundle for `identifier` without waiting for it.
+    """
+    if not identifier:
+        return
+    now = time.monotonic()
+    with _prefetch_lock:
+        for key in [k for k, (expires_at, _, _) in _prefetched.items() if expires_at <= now]:
+            del _prefetched[key]
+        if identifier in _prefetched:
+            return
+        ctx = contextvars.copy_context()
+        future = _io_pool.submit(ctx.run, _fetch_customer_context, identifier)
+        _prefetched[identifier] = (now + PREFETCH_TTL_SECONDS, _data_version(), future)
+
+def _take_prefetched(identifier: str):
+    with _prefetch_lock:
+        entry = _prefetched.pop(identifier, None)
+    if entry is None:
+        return None
+    expires_at, version, future = entry
+    # Don't serve a bundle built from an older data snapshot than this run reads
+    if expires_at <= time.monotonic() or version != _data_version():
+        return None
+    return future
+
+async def arecord_service_ticket(ticket: dict) -> bool:
+    return await _run_io(record_service_ticket, ticket)
+
+async def arecord_crm_opportunity(opportunity: dict) -> bool:
+    return await _run_io(record_crm_opportunity, opportunity)
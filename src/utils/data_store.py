@@ -0,0 +1,440 @@
+import numpy as np
+import copy
+import pandas as pd
+import os
+import threading
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from src.utils import columnar_cache
+from src.utils.site_status import METRIC_COLUMNS, build_site_status, size_by_site
+from src.utils.production_forecast import ProductionForecast, fit_forecast
+from src.utils.metrics_query import MetricsIndex
+
+# Natural keys we look rows up by, per supportingData table
+TABLE_KEYS: Dict[str, Tuple[str, ...]] = {
+    "customers.csv": ("email", "phone"),
+    "sites.csv": ("site_id",),
+    "weekly_metrics.csv": ("site_id",),
+    "proposals.csv": ("customer_id",),
+    "email_otp.csv": ("email",),
+    "sms_otp.csv": ("phone",),
+    "agent_availability.csv": ("department",),
+    "proposal_template.csv": (),
+    "site_issues.csv": ("site_id",),
+    "service_tickets.csv": ("customer_id",),
+}
+
+# Ticket statuses that still count as open for the customer context bundle
+OPEN_TICKET_STATUSES = ("Open", "In Progress")
+
+class Column:
+    """
+    One table column: a numpy array (possibly memory-mapped) or StringColumn,
+    plus an optional null mask. Cells come back as plain Python values, with
+    NaN for nulls, exactly as DataFrame.to_dict(orient="records") gave them.
+    """
+    def __init__(self, data, nulls=None):
+        self.data = data
+        self.nulls = nulls
+
+    def __getitem__(self, pos: int):
+        if self.nulls is not None and self.nulls[pos]:
+            return float("nan")
+        value = self.data[pos]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def tolist(self) -> List:
+        return [self[pos] for pos in range(len(self))]
+
+    def array(self) -> np.ndarray:
+        """
+        The whole column as one array for vectorized work: numeric columns as
+        they're stored (float64 with NaN if there are nulls), others as objects.
+        """
+        data = self.data
+        if isinstance(data, np.ndarray) and data.dtype.kind in "biuf":
+            if self.nulls is None:
+                return np.asarray(data)
+            values = data.astype(np.float64)
+            values[np.asarray(self.nulls)] = np.nan
+            return values
+        return np.array(self.tolist(), dtype=object)
+
+class Table:
+    """
+    A supportingData table held column-wise, with sorted indexes on its natural keys.
+    Index values are stringified so lookups match the old `.astype(str) == str(x)` filters.
+    Rows are only materialized into dicts when a lookup returns them.
+    """
+    def __init__(self, filename: str, columns: Dict[str, Column], keys: Tuple[str, ...] = (), signature: Tuple = (),
+                 indexes: Optional[Dict[str, columnar_cache.KeyIndex]] = None):
+        self.filename = filename
+        self.signature = signature
+        self.columns = columns
+        # Compiled indexes are memory-mapped; build any that the cache doesn't have
+        self.indexes: Dict[str, columnar_cache.KeyIndex] = {}
+        for key in keys:
+            index = (indexes or {}).get(key)
+            if index is None:
+                column = columns[key]
+                nulls = column.nulls if column.nulls is not None else np.zeros(len(column), dtype=bool)
+                index = columnar_cache.KeyIndex.from_values(columnar_cache.key_strings(column.tolist(), nulls))
+            self.indexes[key] = index
+
+    @classmethod
+    def from_frame(cls, filename: str, df: pd.DataFrame, keys: Tuple[str, ...] = (), signature: Tuple = ()) -> "Table":
+        columns = {}
+        for name in df.columns:
+            nulls = df[name].isna().to_numpy()
+            columns[name] = Column(df[name].to_numpy(), nulls if nulls.any() else None)
+        return cls(filename, columns, keys, signature)
+
+    def __len__(self) -> int:
+        first = next(iter(self.columns.values()), None)
+        return len(first) if first is not None else 0
+
+    def row(self, pos: int) -> Dict:
+        return {name: col[pos] for name, col in self.columns.items()}
+
+    def positions(self, key: str, value) -> List[int]:
+        return self.indexes[key].lookup(value)
+
+    def find_all(self, key: str, value) -> List[Dict]:
+        return [self.row(pos) for pos in self.positions(key, value)]
+
+    def find_one(self, key: str, value) -> Optional[Dict]:
+        positions = self.positions(key, value)
+        return self.row(positions[0]) if positions else None
+
+    def all(self) -> List[Dict]:
+        return [self.row(pos) for pos in range(len(self))]
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame({name: col.tolist() for name, col in self.columns.items()})
+
+class DataSnapshot:
+    """
+    An immutable, versioned set of tables. Readers hold on to one snapshot for
+    the whole graph run; reloads build a new snapshot instead of mutating this one.
+    """
+    def __init__(self, tables: Dict[str, Table], version: int):
+        self._tables = dict(tables)
+        self.version = version
+        self._derived: Dict[str, object] = {}
+        self._derived_lock = threading.RLock() # Builders may use other derived views
+
+    def table(self, filename: str) -> Table:
+        return self._tables[filename]
+
+    def tables(self) -> Dict[str, Table]:
+        return dict(self._tables)
+
+    def derived(self, name: str, builder: Callable[["DataSnapshot"], object]):
+        """
+        A view computed from this snapshot's tables, built once on first use.
+        Reloads produce a new snapshot, so derived views never go stale.
+        """
+        if name not in self._derived:
+            with self._derived_lock:
+                if name not in self._derived:
+                    self._derived[name] = builder(self)
+        return self._derived[name]
+
+def clean_record(record: Dict) -> Dict:
+    # NaN isn't valid JSON and the bundle lives on State, so blanks become None
+    return {k: (None if isinstance(v, float) and v != v else v) for k, v in record.items()}
+
+def _group_records(df: pd.DataFrame, key: str) -> Dict[str, List[Dict]]:
+    if df.empty:
+        return {}
+    keys = df[key].astype(str)
+    records = df.to_dict(orient="records")
+    grouped: Dict[str, List[Dict]] = {}
+    for k, record in zip(keys.tolist(), records):
+        grouped.setdefault(k, []).append(clean_record(record))
+    return grouped
+
+def build_customer_bundles(snapshot: DataSnapshot) -> Dict[str, Dict]:
+    """
+    Everything a service or sales conversation reads about a customer, joined once
+    per snapshot: customer row, site row, metrics, proposals and open tickets.
+    Keyed by str(customer_id).
+    """
+    customers = snapshot.table("customers.csv").frame()
+    sites = snapshot.table("sites.csv").frame()
+    tickets = snapshot.table("service_tickets.csv").frame()
+
+    # Join on row positions rather than pulling site columns through the merge,
+    # so a customer without a site can't upcast every site's ints to floats
+    site_positions = pd.DataFrame({
+        "_site_key": sites["site_id"].astype(str),
+        "_site_pos": range(len(sites)),
+    }).drop_duplicates("_site_key")
+    joined = pd.DataFrame({
+        "_customer_pos": range(len(customers)),
+        "_site_key": customers["site_id"].astype(str),
+    }).merge(site_positions, on="_site_key", how="left")
+
+    customer_records = customers.to_dict(orient="records")
+    site_records = sites.to_dict(orient="records")
+    metrics_by_site = _group_records(snapshot.table("weekly_metrics.csv").frame(), "site_id")
+    proposals_by_customer = _group_records(snapshot.table("proposals.csv").frame(), "customer_id")
+    open_tickets = tickets[tickets["status"].isin(OPEN_TICKET_STATUSES)] if not tickets.empty else tickets
+    tickets_by_customer = _group_records(open_tickets, "customer_id")
+
+    bundles = {}
+    for customer_pos, site_key, site_pos in joined.itertuples(index=False, name=None):
+        customer = customer_records[customer_pos]
+        customer_id = str(customer["customer_id"])
+        if customer_id in bundles:
+            continue # Earliest row wins, like the identifier lookup
+        bundles[customer_id] = {
+            "customer": clean_record(customer),
+            "site": clean_record(site_records[int(site_pos)]) if site_pos == site_pos else None,
+            "metrics": metrics_by_site.get(site_key, []),
+            "proposals": proposals_by_customer.get(customer_id, []),
+            "open_tickets": tickets_by_customer.get(customer_id, []),
+        }
+    return bundles
+
+def build_forecast(snapshot: DataSnapshot) -> ProductionForecast:
+    """Per-site production forecast coefficients (src.utils.production_forecast)."""
+    metrics = snapshot.table("weekly_metrics.csv").columns
+    return fit_forecast(metrics["site_id"].array(), metrics["date"].array(), metrics["production_kwh"].array(),
+                        metrics["cloudiness_percentage"].array(), size_by_site(snapshot.table("sites.csv").all()))
+
+def build_site_status_view(snapshot: DataSnapshot) -> Dict[str, Dict]:
+    """The fleet site status view (src.utils.site_status) for a snapshot."""
+    metrics = snapshot.table("weekly_metrics.csv")
+    return build_site_status(
+        snapshot.table("sites.csv").all(),
+        snapshot.table("site_issues.csv").all(),
+        {name: metrics.columns[name].array() for name in METRIC_COLUMNS},
+        forecast=snapshot.derived("production_forecast", build_forecast),
+    )
+
+def build_metrics_index(snapshot: DataSnapshot) -> MetricsIndex:
+    """Date-sorted per-site index of weekly_metrics (src.utils.metrics_query)."""
+    metrics = snapshot.table("weekly_metrics.csv")
+    return MetricsIndex({name: metrics.columns[name].array() for name in METRIC_COLUMNS},
+                        lambda pos: clean_record(metrics.row(pos)))
+
+# Derived views built as soon as a snapshot is loaded, so no request pays for the build
+PREBUILT_VIEWS: Dict[str, Callable[[DataSnapshot], object]] = {
+    "production_forecast": build_forecast,
+    "site_status": build_site_status_view,
+    "metrics_index": build_metrics_index,
+}
+
+def file_signature(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+# Snapshot pinned for the current graph run (see DataStore.pinned)
+_pinned: ContextVar[Optional[DataSnapshot]] = ContextVar("pinned_data_snapshot", default=None)
+
+class DataStore:
+    """
+    Loads each supportingData table once per process and serves indexed lookups.
+    A background watcher can rebuild changed tables and swap in a new snapshot.
+    """
+    def __init__(self, path_resolver: Callable[[str], str]):
+        self._path_resolver = path_resolver
+        self._snapshot: Optional[DataSnapshot] = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _load_table(self, filename: str) -> Table:
+        path = self._path_resolver(filename)
+        signature = file_signature(path)
+        keys = TABLE_KEYS.get(filename, ())
+        # Prefer the memory-mapped compiled build; parse the CSV if it's missing or stale
+        compiled = columnar_cache.load_columns(path)
+        if compiled is not None:
+            columns = {name: Column(data, compiled["nulls"].get(name)) for name, data in compiled["columns"].items()}
+            return Table(filename, columns, keys, signature, compiled["indexes"])
+        return Table.from_frame(filename, pd.read_csv(path), keys, signature)
+
+    def snapshot(self) -> DataSnapshot:
+        pinned = _pinned.get()
+        if pinned is not None:
+            return pinned
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    tables = {filename: self._load_table(filename) for filename in TABLE_KEYS}
+                    self._snapshot = DataSnapshot(tables, version=1)
+                snapshot = self._snapshot
+        return snapshot
+
+    def table(self, filename: str) -> Table:
+        return self.snapshot().table(filename)
+
+    @property
+    def version(self) -> int:
+        return self.snapshot().version
+
+    @contextmanager
+    def pinned(self):
+        """
+        Pin the current snapshot for the duration of a graph run so every node
+        reads the same version even if a reload lands mid-run.
+        """
+        token = _pinned.set(self.snapshot())
+        try:
+            yield _pinned.get()
+        finally:
+            try:
+                _pinned.reset(token)
+            except ValueError:
+                # Generator closed from another context (client disconnect); nothing to restore
+                pass
+
+    def reload_changed(self) -> bool:
+        """
+        Rebuild any table whose file mtime/size changed and atomically swap in a
+        new snapshot. Returns True if a reload happened.
+        """
+        current = self._snapshot
+        if current is None:
+            return False # Nothing loaded yet, the first read will see the new files
+        changed = {}
+        for filename, table in current.tables().items():
+            try:
+                signature = file_signature(self._path_resolver(filename))
+                if signature != table.signature:
+                    changed[filename] = self._load_table(filename)
+            except Exception:
+                # Half-written or missing file: keep serving the old table and retry next poll
+                traceback.print_exc()
+        if not changed:
+            return False
+        with self._lock:
+            tables = self._snapshot.tables()
+            tables.update(changed)
+            snapshot = DataSnapshot(tables, version=self._snapshot.version + 1)
+            self._snapshot = snapshot
+        print(f"DEBUG: Reloaded {sorted(changed)} -> data snapshot v{snapshot.version}")
+        self.prebuild(snapshot)
+        return True
+
+    def prebuild(self, snapshot: DataSnapshot):
+        for name, builder in PREBUILT_VIEWS.items():
+            try:
+                snapshot.derived(name, builder)
+            except Exception:
+                # Built lazily on first use instead, which raises to the caller
+                traceback.print_exc()
+
+    def start_watcher(self, interval: float = 2.0):
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.reload_changed()
+
+        self._watcher = threading.Thread(target=watch, name="data-store-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+class MemoryBackend:
+    """
+    data_loader backend that answers queries from the resident DataStore.
+    The CSV tables are read-only, so record_* writes are not persisted.
+    """
+    name = "memory"
+
+    def __init__(self, store: DataStore):
+        self.store = store
+
+    def customer_by_identifier(self, identifier: str) -> Optional[Dict]:
+        customers = self.store.table("customers.csv")
+        # Match email or phone, keeping the earliest row like the old boolean filter did
+        positions = customers.positions("email", identifier) + customers.positions("phone", identifier)
+        return customers.row(min(positions)) if positions else None
+
+    def site_by_id(self, site_id: str) -> Optional[Dict]:
+        return self.store.table("sites.csv").find_one("site_id", site_id)
+
+    def metrics_by_site(self, site_id: str) -> List[Dict]:
+        return self.store.table("weekly_metrics.csv").find_all("site_id", site_id)
+
+    def proposals_by_customer(self, customer_id: str) -> List[Dict]:
+        return self.store.table("proposals.csv").find_all("customer_id", customer_id)
+
+    def query_metrics(self, site_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                      period: Optional[str] = None, last: Optional[int] = None) -> List[Dict]:
+        index = self.store.snapshot().derived("metrics_index", build_metrics_index)
+        return index.query(site_id, start, end, period, last)
+
+    def otp_matches(self, identifier: str, otp: str, channel: str) -> bool:
+        filename = "email_otp.csv" if channel == "email" else "sms_otp.csv"
+        id_col = "email" if channel == "email" else "phone"
+        rows = self.store.table(filename).find_all(id_col, identifier)
+        return any(str(r['otp']) == str(otp) for r in rows)
+
+    def agents_online(self, department: str) -> bool:
+        rows = self.store.table("agent_availability.csv").find_all("department", department)
+        return any(str(r['is_online']).lower() == 'true' for r in rows)
+
+    def proposal_templates(self) -> List[Dict]:
+        return self.store.table("proposal_template.csv").all()
+
+    def site_status(self, site_id: str) -> Optional[Dict]:
+        record = self.store.snapshot().derived("site_status", build_site_status_view).get(str(site_id))
+        return dict(record) if record else None
+
+    def forecast_production(self, site_id: str, cloudiness: float, day: int) -> Optional[float]:
+        snapshot = self.store.snapshot()
+        site = snapshot.table("sites.csv").find_one("site_id", site_id)
+        forecast = snapshot.derived("production_forecast", build_forecast)
+        return forecast.expected(site_id, site.get("system_size_kw"), day, cloudiness) if site else None
+
+    def customer_context(self, identifier: str) -> Optional[Dict]:
+        snapshot = self.store.snapshot()
+        customers = snapshot.table("customers.csv")
+        positions = customers.positions("email", identifier) + customers.positions("phone", identifier)
+        if not positions:
+            return None
+        customer_id = str(customers.row(min(positions))["customer_id"])
+        bundle = snapshot.derived("customer_bundles", build_customer_bundles).get(customer_id)
+        return copy.deepcopy(bundle) if bundle else None
+
+    def site_issues(self) -> List[Dict]:
+        return self.store.table("site_issues.csv").all()
+
+    def record_service_ticket(self, ticket: Dict) -> bool:
+        return False
+
+    def record_crm_opportunity(self, opportunity: Dict) -> bool:
+        return False
+
+    @property
+    def version(self) -> int:
+        return self.store.version
+
+    def pinned(self):
+        return self.store.pinned()
+
+    def start_watcher(self, interval: float):
+        self.store.prebuild(self.store.snapshot()) # Load tables and views up front
+        self.store.start_watcher(interval)
+
+    def describe(self) -> Dict:
+        snapshot = self.store.snapshot()
+        return {
+            "backend": self.name,
+            "snapshot_version": snapshot.version,
+            "tables": {name: {"rows": len(t), "mtime_ns": t.signature[0], "size": t.signature[1]} for name, t in snapshot.tables().items()}
+        }
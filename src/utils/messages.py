@@ -0,0 +1,208 @@
+"""
+Canonical chat messages.
+
+Every message is normalized once, when a node emits it (the State.messages
+reducer) or app.py appends the human input, into
+{"type", "content", "id"[, "additional_kwargs": {"options"}]}.
+Rendering a normalized message is then a pass-through.
+
+A thread's history is a MessageLog: a persistent append-only log. Appending
+returns a new log that shares the existing messages instead of copying them,
+and earlier logs keep seeing what they saw. LangGraph evaluates conditional
+edges on a shallow copy of the channels with the step's writes applied, so
+the reducer runs twice on the same log with the same messages; the second
+append finds them already there and shares them too.
+"""
+import hashlib
+import threading
+import uuid
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional, Tuple
+from langgraph.channels.binop import BinaryOperatorAggregate
+
+CANONICAL_KEYS = frozenset(("type", "content", "id", "additional_kwargs"))
+
+def normalize_message(m, idx: int = 0):
+    """Ensure message is a dict with type, content, and STABLE id."""
+    try:
+        if isinstance(m, str):
+            content = m or " "
+            # Default to AI for strings unless they look like human input handled by nodes
+            mid = f"msg-{hashlib.md5((content + str(idx)).encode()).hexdigest()[:12]}"
+            return {"type": "ai", "content": content, "id": mid}
+
+        if isinstance(m, dict):
+            content = m.get("content") or m.get("text") or " "
+            mtype = m.get("type") or m.get("role") or "ai"
+            msg_id = m.get("id") or f"{mtype}-{hashlib.md5((content + str(idx)).encode()).hexdigest()[:12]}"
+
+            msg_obj = {"type": mtype, "content": content, "id": msg_id}
+            # Standard buttons/options for Aegra
+            options = m.get("buttons") or (m.get("additional_kwargs") or {}).get("options")
+            if options:
+                msg_obj["additional_kwargs"] = {"options": options}
+            return msg_obj
+    except Exception:
+        return {"type": "ai", "content": str(m), "id": f"err-{uuid.uuid4().hex[:8]}"}
+    return m
+
+def is_canonical(m) -> bool:
+    return isinstance(m, dict) and bool(m.get("id")) and bool(m.get("type")) and bool(m.get("content")) and m.keys() <= CANONICAL_KEYS
+
+def format_message(m, idx: int = 0):
+    """
+    Render a message for the API. Messages stored before normalization moved to
+    creation time (older checkpoints) are normalized here on the fly.
+    """
+    if is_canonical(m):
+        return m
+    return normalize_message(m, idx)
+
+# Guards growing a shared log, should two runs ever append to the same one at once
+_grow_lock = threading.Lock()
+
+class MessageLog(Sequence):
+    """
+    Append-only message history: a view of the first `len` entries of a
+    backing list that every log appended from it shares. Reads like a list
+    (indexing, slicing, iteration, ==); slices are plain lists.
+    """
+    __slots__ = ("_items", "_length")
+
+    def __init__(self, messages: Iterable = ()):
+        self._items = list(messages)
+        self._length = len(self._items)
+
+    @classmethod
+    def _view(cls, items: List, length: int) -> "MessageLog":
+        log = cls.__new__(cls)
+        log._items = items
+        log._length = length
+        return log
+
+    @classmethod
+    def wrap(cls, messages) -> "MessageLog":
+        """`messages` as a log; other sequences are copied, never adopted."""
+        if isinstance(messages, MessageLog):
+            return messages
+        return cls(messages if isinstance(messages, (list, tuple)) else ())
+
+    def appended(self, messages: Iterable) -> "MessageLog":
+        """A new log with `messages` after this one's. O(len(messages)) unless it has to fork."""
+        new = list(messages)
+        if not new:
+            return self
+        items, n = self._items, self._length
+        with _grow_lock:
+            if n == len(items):
+                items.extend(new)
+            elif items[n:n + len(new)] != new:
+                # Another log already grew from here with different messages: fork
+                items = items[:n] + new
+        return MessageLog._view(items, n + len(new))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1:
+                return self._items[start:stop]
+            return [self._items[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("message index out of range")
+        return self._items[index]
+
+    def __iter__(self):
+        items = self._items
+        for i in range(self._length):
+            yield items[i]
+
+    def __reversed__(self):
+        items = self._items
+        for i in range(self._length - 1, -1, -1):
+            yield items[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, MessageLog):
+            return self._length == other._length and (
+                (self._items is other._items) or self[:] == other[:]
+            )
+        if isinstance(other, list):
+            return self[:] == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"MessageLog({self.tolist()!r})"
+
+    def __reduce__(self):
+        return (MessageLog, (self.tolist(),))
+
+    def tolist(self) -> List:
+        return self._items[:self._length]
+
+    def last(self, mtype: Optional[str] = None):
+        """Newest message, or the newest of `mtype`; None if there is none."""
+        for m in reversed(self):
+            if mtype is None or (m.get("type") if isinstance(m, dict) else "ai") == mtype:
+                return m
+        return None
+
+    def window(self, start: int, stop: Optional[int] = None) -> List:
+        """Messages from offset `start` (negative counts from the end); only the window is copied."""
+        return self[start:stop]
+
+def message_window(messages: List, after_id: Optional[str] = None, limit: Optional[int] = None) -> Tuple[Optional[List], bool]:
+    """
+    The messages after the one with id `after_id` (up to `limit` of them), or
+    the newest `limit` without it. Returns (window, more after it); the window
+    is None if `after_id` isn't in the thread.
+    """
+    start = 0
+    if after_id is not None:
+        # Clients page from what they last saw, usually near the end
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], dict) and messages[i].get("id") == after_id:
+                start = i + 1
+                break
+        else:
+            return None, False
+    elif limit is not None:
+        start = max(0, len(messages) - limit)
+    stop = len(messages) if limit is None else min(len(messages), start + limit)
+    return messages[start:stop], stop < len(messages)
+
+def add_messages(left, right: List) -> MessageLog:
+    """
+    State.messages reducer: append, normalizing each new message with its position in the thread.
+    """
+    start = len(left)
+    return MessageLog.wrap(left).appended(normalize_message(m, start + i) for i, m in enumerate(right))
+
+class MessageLogChannel(BinaryOperatorAggregate):
+    """
+    State.messages channel: reduces with add_messages and always holds a
+    MessageLog (input and Overwrite lists are copied into one). Checkpoints
+    store the plain list.
+    """
+    def __init__(self, typ=list, operator=add_messages):
+        super().__init__(typ, operator)
+        self.value = MessageLog()
+
+    def from_checkpoint(self, checkpoint):
+        channel = super().from_checkpoint(checkpoint)
+        channel.value = MessageLog.wrap(channel.value)
+        return channel
+
+    def update(self, values) -> bool:
+        updated = super().update(values)
+        self.value = MessageLog.wrap(self.value)
+        return updated
+
+    def checkpoint(self):
+        return self.value.tolist()
@@ -0,0 +1,160 @@
+"""
+Streaming ingestion of monitoring metric exports.
+
+weekly_metrics.csv could only be replaced wholesale. This appends new metric
+files to the SQLite data store in bounded-memory chunks instead:
+
+- each file is read INGEST_CHUNK_ROWS rows at a time;
+- rows whose metric_id is already stored (or earlier in the same run) are
+  dropped, so re-delivered exports are harmless;
+- new rows go into weekly_metrics, which is read by (site_id, date) index
+  ranges, i.e. one contiguous partition per site;
+- the site_metric_totals running aggregates are updated in the same
+  transaction as the rows, so the status view never re-reads full history.
+
+Each chunk commits on its own, and a rerun after a failure skips what was
+already stored. Served by DATA_BACKEND=sqlite; the memory backend keeps
+serving weekly_metrics.csv. Re-importing the CSVs with
+`python -m src.utils.sqlite_backend` replaces ingested rows. Production
+forecasts aren't refitted per chunk but once a run has inserted rows, so
+site_forecast doesn't go stale.
+
+    python -m src.utils.metrics_ingest export1.csv [export2.csv ...]
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+from src.utils.sqlite_backend import SQL_KINDS, SQL_TOTALS_UPSERT, _connect, _encode, import_csvs
+from src.utils.production_forecast import refit_sqlite
+
+INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", "50000"))
+
+# Columns a metrics export must carry
+REQUIRED_COLUMNS = ("metric_id", "site_id", "date")
+
+SQL_STAGE_CREATE = "CREATE TEMP TABLE IF NOT EXISTS _ingest_ids (metric_id TEXT PRIMARY KEY)"
+SQL_STAGE_CLEAR = "DELETE FROM _ingest_ids"
+SQL_STAGE_INSERT = "INSERT OR IGNORE INTO _ingest_ids VALUES (?)"
+SQL_STORED_IDS = "SELECT s.metric_id FROM _ingest_ids s JOIN weekly_metrics m ON m.metric_id = s.metric_id"
+
+def _table_columns(conn) -> Dict[str, str]:
+    return {col: kind for table, col, kind in conn.execute(SQL_KINDS) if table == "weekly_metrics"}
+
+def _key_text(values: pd.Series) -> pd.Series:
+    # A blank cell turns an integer id column into floats: 302 would be stored as "302.0"
+    if pd.api.types.is_float_dtype(values) and (values % 1 == 0).all():
+        values = values.astype(np.int64)
+    return values.astype(str).str.strip()
+
+def _normalize(chunk: pd.DataFrame) -> pd.DataFrame:
+    missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Metrics export is missing columns: {', '.join(missing)}")
+    chunk = chunk.dropna(subset=["metric_id", "site_id"])
+    # Keys are stored as text of the value; dates as ISO text so ranges compare in order
+    chunk = chunk.assign(
+        metric_id=_key_text(chunk["metric_id"]),
+        site_id=_key_text(chunk["site_id"]),
+        date=pd.to_datetime(chunk["date"], errors="coerce").dt.strftime("%Y-%m-%d"),
+    )
+    return chunk.drop_duplicates("metric_id")
+
+def _totals(rows: pd.DataFrame):
+    """site_metric_totals increments for new rows, one tuple per site."""
+    days = (pd.to_datetime(rows["date"]) - pd.Timestamp("1970-01-01")).dt.days.astype(np.float64)
+    score = pd.to_numeric(rows.get("performance_score", pd.Series(np.nan, index=rows.index)), errors="coerce")
+    scored = days.notna() & score.notna()
+    x, y = days.where(scored, 0.0), score.where(scored, 0.0)
+    grouped = pd.DataFrame({
+        "site_id": rows["site_id"], "readings": 1, "last_date": rows["date"].where(days.notna()),
+        "scored": scored.astype(np.int64), "sum_x": x, "sum_y": y, "sum_xx": x * x, "sum_xy": x * y,
+    }).groupby("site_id", sort=False).agg({
+        "readings": "sum", "last_date": "max", "scored": "sum",
+        "sum_x": "sum", "sum_y": "sum", "sum_xx": "sum", "sum_xy": "sum",
+    })
+    return [
+        (site, int(r.readings), None if pd.isna(r.last_date) else r.last_date, int(r.scored),
+         float(r.sum_x), float(r.sum_y), float(r.sum_xx), float(r.sum_xy))
+        for site, r in zip(grouped.index.tolist(), grouped.itertuples(index=False))
+    ]
+
+def ingest_chunk(conn, chunk: pd.DataFrame, columns: Dict[str, str]) -> Dict[str, int]:
+    """Append one chunk's new readings and their aggregates in one transaction."""
+    rows = _normalize(chunk)
+    with conn:
+        conn.execute(SQL_STAGE_CREATE)
+        conn.execute(SQL_STAGE_CLEAR)
+        conn.executemany(SQL_STAGE_INSERT, ((mid,) for mid in rows["metric_id"].tolist()))
+        stored = {str(mid) for (mid,) in conn.execute(SQL_STORED_IDS)}
+        new = rows[~rows["metric_id"].isin(stored)]
+        cols = [col for col in columns if col in new.columns]
+        if len(new):
+            keys = {"metric_id", "site_id", "date"}
+            names = ", ".join(f'"{c}"' for c in cols)
+            placeholders = ", ".join("?" for _ in cols)
+            conn.executemany(
+                f'INSERT INTO weekly_metrics ({names}) VALUES ({placeholders})',
+                (tuple(_encode(v, columns[c], c in keys) for v, c in zip(row, cols))
+                 for row in new[cols].itertuples(index=False, name=None))
+            )
+            conn.executemany(SQL_TOTALS_UPSERT, _totals(new))
+    # Skipped: already stored, repeated within the chunk, or without a metric_id/site_id
+    return {"read": len(chunk), "skipped": len(chunk) - len(new), "inserted": len(new)}
+
+def refit_forecasts(conn) -> int:
+    """Refit site_forecast from everything stored. Returns sites fitted."""
+    with conn:
+        # Ingests wait, so no rows land between the read and the replace
+        conn.execute("BEGIN IMMEDIATE")
+        return refit_sqlite(conn)
+
+def ingest_metrics(source, db_path: Optional[str] = None, chunk_rows: int = INGEST_CHUNK_ROWS,
+                   refit: bool = True) -> Dict[str, int]:
+    """
+    Stream one metrics export (path or file object, weekly_metrics.csv
+    columns) into the SQLite data store, then refit the production
+    forecasts if any rows were inserted and `refit` is set. Returns row
+    counts (read, skipped and inserted) and the sites refitted.
+    """
+    from src.utils.data_loader import SQLITE_PATH, get_csv_path
+    db_path = db_path or SQLITE_PATH
+    import_csvs(db_path, get_csv_path, replace=False) # First use creates the store from the CSVs
+    conn = _connect(db_path)
+    try:
+        columns = _table_columns(conn)
+        stats = {"read": 0, "skipped": 0, "inserted": 0, "refitted": 0}
+        # Ids as written, as import_csvs stores them, whatever else is in the chunk
+        for chunk in pd.read_csv(source, chunksize=chunk_rows, dtype={"metric_id": str, "site_id": str}):
+            for key, count in ingest_chunk(conn, chunk, columns).items():
+                stats[key] += count
+        if refit and stats["inserted"]:
+            stats["refitted"] = refit_forecasts(conn)
+        return stats
+    finally:
+        conn.close()
+
+def ingest_files(paths: Iterable[str], db_path: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    """Ingest each export in turn, refitting the forecasts once at the end."""
+    from src.utils.data_loader import SQLITE_PATH
+    results = {path: ingest_metrics(path, db_path, refit=False) for path in paths}
+    if any(stats["inserted"] for stats in results.values()):
+        conn = _connect(db_path or SQLITE_PATH)
+        try:
+            fitted = refit_forecasts(conn)
+        finally:
+            conn.close()
+        for stats in results.values():
+            stats["refitted"] = fitted
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m src.utils.metrics_ingest export.csv [export.csv ...]")
+    results = ingest_files(sys.argv[1:])
+    for path, stats in results.items():
+        print(f"Ingested {path}: {stats['inserted']} new of {stats['read']} rows ({stats['skipped']} skipped)")
+    fitted = max((stats["refitted"] for stats in results.values()), default=0)
+    if fitted:
+        print(f"Refitted production forecasts for {fitted} sites")
@@ -0,0 +1,149 @@
+"""
+Time-windowed metrics queries.
+
+load_metrics_by_site returns every row ever recorded for a site, so anything
+answering "this week" cost (and summed) the site's whole history. Here each
+site's readings sit in one date-sorted slice of a fleet-wide index, and a
+query is two binary searches inside that slice: a week's window touches the
+week's rows whatever the history length.
+
+Queries take ISO date bounds (inclusive), an optional period to downsample
+to ("day", "week" starting Monday, "month") and `last`: the last N periods,
+or the last N readings without a period, ending at `end` or the site's
+latest reading. Readings without a parseable date aren't indexed.
+"""
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple
+
+PERIODS = ("day", "week", "month")
+
+# Days per "this week" window in the status view
+WEEK_DAYS = 7
+
+def parse_days(dates) -> np.ndarray:
+    """ISO dates as float days since the epoch, NaN where missing or unparseable."""
+    # Parse each distinct date once: there are far fewer dates than readings
+    codes, uniques = pd.factorize(np.asarray(dates))
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors="coerce")
+    values = np.append(parsed.to_numpy("datetime64[D]").astype(np.int64).astype(np.float64), np.nan)
+    values[:-1][parsed.isna().to_numpy()] = np.nan
+    return values[codes] # Missing dates have code -1, the trailing NaN
+
+def check_query(period: Optional[str], last: Optional[int]):
+    if period is not None and period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+    if last is not None and last < 1:
+        raise ValueError("last must be at least 1")
+
+def to_day(date: str) -> int:
+    try:
+        return int(np.datetime64(date, "D").astype(np.int64))
+    except ValueError:
+        raise ValueError(f"Invalid date {date!r}, expected YYYY-MM-DD")
+
+def day_str(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+def period_start(days: np.ndarray, period: str) -> np.ndarray:
+    """The first day of the period each day falls in."""
+    if period == "day":
+        return days
+    if period == "week":
+        return days - (days + 3) % 7 # 1970-01-01 was a Thursday
+    if period == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+
+def periods_back(day: int, period: str, count: int) -> int:
+    """The first day of the period `count - 1` periods before the one `day` is in."""
+    start = int(period_start(np.array([day], dtype=np.int64), period)[0])
+    if period == "day":
+        return start - (count - 1)
+    if period == "week":
+        return start - 7 * (count - 1)
+    month = np.datetime64(day_str(start), "M") - (count - 1)
+    return int(month.astype("datetime64[D]").astype(np.int64))
+
+class MetricsIndex:
+    """
+    Every site's readings sorted by date, as slices of fleet-wide arrays.
+    `row(position)` materializes a reading by its position in the source table.
+    """
+    def __init__(self, columns: Dict[str, np.ndarray], row: Callable[[int], Dict]):
+        self._row = row
+        codes, uniques = pd.factorize(np.asarray(columns["site_id"]))
+        days = parse_days(columns["date"])
+        dated = np.flatnonzero(~np.isnan(days) & (codes >= 0))
+        order = dated[np.lexsort((days[dated], codes[dated]))]
+        sorted_codes = codes[order]
+        self._positions = order
+        self._days = days[order].astype(np.int64)
+        self._production = np.asarray(columns["production_kwh"], dtype=np.float64)[order]
+        self._cloudiness = np.asarray(columns["cloudiness_percentage"], dtype=np.float64)[order]
+        self._performance = np.asarray(columns["performance_score"], dtype=np.float64)[order]
+        bounds = np.searchsorted(sorted_codes, np.arange(len(uniques) + 1))
+        self._slices: Dict[str, Tuple[int, int]] = {
+            str(site): (int(lo), int(hi)) for site, lo, hi in zip(uniques.tolist(), bounds[:-1], bounds[1:]) if hi > lo
+        }
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def latest(self, site_id) -> Optional[str]:
+        lo, hi = self._slices.get(str(site_id), (0, 0))
+        return day_str(self._days[hi - 1]) if hi > lo else None
+
+    def _window(self, site_id, start: Optional[str], end: Optional[str], period: Optional[str], last: Optional[int]) -> Tuple[int, int]:
+        lo, hi = self._slices.get(str(site_id), (0, 0))
+        if hi == lo:
+            return lo, lo
+        days = self._days[lo:hi]
+        if end is not None:
+            hi = lo + int(np.searchsorted(days, to_day(end), side="right"))
+        if start is not None:
+            lo = lo + int(np.searchsorted(days, to_day(start), side="left"))
+        if last is not None and hi > lo:
+            if period is None:
+                lo = max(lo, hi - last)
+            else:
+                first = periods_back(int(self._days[hi - 1]), period, last)
+                lo = lo + int(np.searchsorted(self._days[lo:hi], first, side="left"))
+        return lo, max(lo, hi)
+
+    def query(self, site_id, start: Optional[str] = None, end: Optional[str] = None,
+              period: Optional[str] = None, last: Optional[int] = None) -> List[Dict]:
+        """Readings (by date) or per-period aggregates for a site; see the module docstring."""
+        check_query(period, last)
+        lo, hi = self._window(site_id, start, end, period, last)
+        if period is None:
+            return [self._row(int(pos)) for pos in self._positions[lo:hi]]
+        return downsample(self._days[lo:hi], self._production[lo:hi], self._cloudiness[lo:hi], self._performance[lo:hi], period)
+
+def downsample(days: np.ndarray, production: np.ndarray, cloudiness: np.ndarray, performance: np.ndarray, period: str) -> List[Dict]:
+    """Per-period totals and means of date-sorted readings. NaN cells are skipped."""
+    if not len(days):
+        return []
+    starts = period_start(days, period)
+    # Sorted by date, so each period is one run of readings
+    edges = np.flatnonzero(np.diff(starts)) + 1
+    bounds = np.concatenate(([0], edges))
+
+    def run_sums(values: np.ndarray):
+        valid = ~np.isnan(values)
+        return np.add.reduceat(np.where(valid, values, 0.0), bounds), np.add.reduceat(valid.astype(np.int64), bounds)
+
+    counts = np.diff(np.append(bounds, len(days)))
+    produced, produced_n = run_sums(production)
+    cloud, cloud_n = run_sums(cloudiness)
+    score, score_n = run_sums(performance)
+    return [
+        {
+            "period_start": day_str(starts[b]),
+            "readings": int(counts[i]),
+            "production_kwh": float(produced[i]) if produced_n[i] else None,
+            "avg_cloudiness": float(cloud[i] / cloud_n[i]) if cloud_n[i] else None,
+            "avg_performance_score": float(score[i] / score_n[i]) if score_n[i] else None,
+        }
+        for i, b in enumerate(bounds.tolist())
+    ]
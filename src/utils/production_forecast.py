@@ -0,0 +1,209 @@
+"""
+Per-site production forecasts from cloudiness and season.
+
+Customers at the status check often ask whether low output is "just
+weather". Each site gets a linear model of production per kW of system size
+on cloudiness and season (sin/cos of the day of year), so the node can say
+what the week's weather should have yielded next to what the site produced.
+
+The fit is batched across the fleet: the normal equations of every site are
+accumulated with a few group sums over the readings, and all the small 4x4
+systems are solved in one np.linalg.solve call. A site with little history
+is shrunk towards the fleet-wide fit (FORECAST_PRIOR_WEIGHT readings' worth),
+so a few days of data don't produce wild seasonal terms.
+
+Coefficients are cached: per data snapshot by the memory backend, and in the
+site_forecast table for the SQLite backend, refitted at import and by
+`python -m src.utils.production_forecast` (e.g. after metrics ingestion).
+The fit streams the table in chunks.
+"""
+import os
+import sqlite3
+import sys
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+FORECAST_PRIOR_WEIGHT = float(os.environ.get("FORECAST_PRIOR_WEIGHT", "14"))
+FORECAST_CHUNK_ROWS = int(os.environ.get("FORECAST_CHUNK_ROWS", "200000"))
+
+YEAR_DAYS = 365.2425
+FEATURES = ("intercept", "cloudiness", "season_sin", "season_cos")
+
+SQL_FORECAST_CREATE = """
+CREATE TABLE IF NOT EXISTS site_forecast (
+    site_id TEXT PRIMARY KEY, readings INTEGER, intercept REAL, cloudiness REAL, season_sin REAL, season_cos REAL
+)
+"""
+SQL_FORECAST_INSERT = "INSERT INTO site_forecast VALUES (?, ?, ?, ?, ?, ?)"
+SQL_FORECAST = "SELECT site_id, readings, intercept, cloudiness, season_sin, season_cos FROM site_forecast"
+SQL_FORECAST_SIZES = "SELECT site_id, system_size_kw FROM sites ORDER BY rowid DESC" # Last wins in a dict: first row per site
+SQL_FORECAST_READINGS = "SELECT site_id, date, production_kwh, cloudiness_percentage FROM weekly_metrics"
+
+def season(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """sin and cos of the day of year, computed once per distinct day."""
+    if not len(days):
+        return np.zeros(0), np.zeros(0)
+    first = np.floor(days.min())
+    span = int(days.max() - first) + 1
+    # Readings share few days: look them up from a table over the date range
+    table = np.arange(span) + first if span < len(days) else days
+    phase = 2 * np.pi * (table % YEAR_DAYS) / YEAR_DAYS
+    if table is days:
+        return np.sin(phase), np.cos(phase)
+    index = (days - first).astype(np.int64)
+    return np.sin(phase)[index], np.cos(phase)[index]
+
+def design(days: np.ndarray, cloudiness: np.ndarray) -> np.ndarray:
+    """Feature rows (FEATURES) for readings by day since 1970-01-01 and cloudiness percentage."""
+    sin, cos = season(days)
+    return np.column_stack([np.ones(len(days)), cloudiness / 100.0, sin, cos])
+
+class NormalSums:
+    """Per-site X'X and X'y of production per kW, grown chunk by chunk."""
+    def __init__(self):
+        self.sites: Dict[str, int] = {}
+        self.xtx = np.zeros((0, 4, 4))
+        self.xty = np.zeros((0, 4))
+        self.readings = np.zeros(0)
+
+    def add(self, site_ids, days: np.ndarray, cloudiness: np.ndarray, production: np.ndarray, size_kw: Dict[str, float]):
+        codes, uniques = pd.factorize(np.asarray(site_ids))
+        keys = [str(site) for site in uniques.tolist()]
+        if not keys:
+            return
+        for key in keys:
+            self.sites.setdefault(key, len(self.sites))
+        grow = len(self.sites) - len(self.readings)
+        if grow:
+            self.xtx = np.concatenate([self.xtx, np.zeros((grow, 4, 4))])
+            self.xty = np.concatenate([self.xty, np.zeros((grow, 4))])
+            self.readings = np.concatenate([self.readings, np.zeros(grow)])
+        to_global = np.array([self.sites[key] for key in keys], dtype=np.int64)
+        sizes = np.array([_positive(size_kw.get(key)) for key in keys], dtype=np.float64)
+        rows = (codes >= 0) & ~np.isnan(days) & ~np.isnan(cloudiness) & ~np.isnan(production) & ~np.isnan(sizes[codes])
+        if not rows.all():
+            codes, days, cloudiness, production = codes[rows], days[rows], cloudiness[rows], production[rows]
+        sites = to_global[codes]
+        y = production / sizes[codes]
+        x = [None, cloudiness / 100.0, *season(days)] # None: the intercept column
+        n = len(self.sites)
+        for i in range(4):
+            self.xty[:, i] += np.bincount(sites, weights=_times(x[i], y), minlength=n)
+            for j in range(i, 4):
+                self.xtx[:, i, j] += np.bincount(sites, weights=_times(x[i], x[j]), minlength=n)
+                self.xtx[:, j, i] = self.xtx[:, i, j]
+        self.readings += np.bincount(sites, minlength=n)
+
+    def solve(self) -> "ProductionForecast":
+        """Every site's coefficients, shrunk towards the fleet fit."""
+        if not len(self.readings):
+            return ProductionForecast([], np.zeros((0, 4)), np.zeros(0))
+        fleet_xtx, fleet_xty = self.xtx.sum(axis=0), self.xty.sum(axis=0)
+        # A touch of ridge keeps the fleet fit defined when a feature doesn't vary (e.g. one season of data)
+        ridge = 1e-6 * max(np.trace(fleet_xtx), 1.0)
+        prior = np.linalg.solve(fleet_xtx + ridge * np.eye(4), fleet_xty)
+        weight = FORECAST_PRIOR_WEIGHT * np.eye(4)
+        coefficients = np.linalg.solve(self.xtx + weight, (self.xty + FORECAST_PRIOR_WEIGHT * prior)[..., None])[..., 0]
+        sites = sorted(self.sites, key=self.sites.get)
+        return ProductionForecast(sites, coefficients, self.readings)
+
+class ProductionForecast:
+    """Cached per-site coefficients: expected production per kW for a reading."""
+    def __init__(self, sites: List[str], coefficients: np.ndarray, readings: np.ndarray):
+        self.index = {site: i for i, site in enumerate(sites)}
+        self.coefficients = coefficients
+        self.readings = readings
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def rows(self, sites: List[str]) -> np.ndarray:
+        """Coefficient rows for `sites`, NaN for sites without a fit."""
+        out = np.full((len(sites), 4), np.nan)
+        for i, site in enumerate(sites):
+            pos = self.index.get(site)
+            if pos is not None:
+                out[i] = self.coefficients[pos]
+        return out
+
+    def expected(self, site_id: str, size_kw: float, day: int, cloudiness: float) -> Optional[float]:
+        """Expected kWh for one day's reading at `cloudiness` percent; None without a fit."""
+        pos = self.index.get(str(site_id))
+        size = _positive(size_kw)
+        if pos is None or np.isnan(size):
+            return None
+        x = design(np.array([float(day)]), np.array([float(cloudiness)]))[0]
+        return float(max(x @ self.coefficients[pos], 0.0) * size)
+
+def _times(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Product of feature columns, None being all ones (a count when both are)."""
+    if a is None:
+        return b
+    return a if b is None else a * b
+
+def _positive(value) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+    return value if value > 0 else float("nan")
+
+def fit_forecast(site_ids, dates, production: np.ndarray, cloudiness: np.ndarray, size_kw: Dict[str, float]) -> ProductionForecast:
+    """Fit every site's model from readings already in memory."""
+    from src.utils.metrics_query import parse_days
+    sums = NormalSums()
+    sums.add(site_ids, parse_days(dates), np.asarray(cloudiness, dtype=np.float64),
+             np.asarray(production, dtype=np.float64), size_kw)
+    return sums.solve()
+
+def forecast_week(forecast: ProductionForecast, codes: np.ndarray, sites: List[str], sizes: np.ndarray,
+                  days: np.ndarray, cloudiness: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-site expected production summed over the given readings (site
+    `codes` into `sites`/`sizes`), and how many readings it covers.
+    """
+    n = len(sites)
+    coefficients = forecast.rows(sites)[codes]
+    rows = ~np.isnan(days) & ~np.isnan(cloudiness) & ~np.isnan(coefficients[:, 0]) & ~np.isnan(sizes[codes])
+    per_kw = np.einsum("ij,ij->i", design(np.where(rows, days, 0.0), np.where(rows, cloudiness, 0.0)), np.nan_to_num(coefficients))
+    expected = np.where(rows, np.maximum(per_kw, 0.0) * np.nan_to_num(sizes[codes]), 0.0)
+    return np.bincount(codes, weights=expected, minlength=n), np.bincount(codes, weights=rows.astype(np.float64), minlength=n)
+
+def refit_sqlite(conn: sqlite3.Connection) -> int:
+    """Refit every site from the database's weekly_metrics and replace site_forecast. Returns sites fitted."""
+    from src.utils.metrics_query import parse_days
+    size_kw = {str(site): size for site, size in conn.execute(SQL_FORECAST_SIZES)}
+    sums = NormalSums()
+    cursor = conn.execute(SQL_FORECAST_READINGS)
+    while True:
+        chunk = cursor.fetchmany(FORECAST_CHUNK_ROWS)
+        if not chunk:
+            break
+        site_ids, dates, production, cloudiness = zip(*chunk)
+        sums.add(np.array(site_ids, dtype=object), parse_days(np.array(dates, dtype=object)),
+                 np.array(cloudiness, dtype=np.float64), np.array(production, dtype=np.float64), size_kw)
+    forecast = sums.solve()
+    rows = [(site, int(forecast.readings[i]), *map(float, forecast.coefficients[i])) for site, i in forecast.index.items()]
+    conn.execute(SQL_FORECAST_CREATE)
+    conn.execute("DELETE FROM site_forecast")
+    conn.executemany(SQL_FORECAST_INSERT, rows)
+    return len(rows)
+
+def load_sqlite(conn: sqlite3.Connection) -> ProductionForecast:
+    rows = conn.execute(SQL_FORECAST).fetchall()
+    if not rows:
+        return ProductionForecast([], np.zeros((0, 4)), np.zeros(0))
+    return ProductionForecast([str(r[0]) for r in rows], np.array([r[2:] for r in rows], dtype=np.float64),
+                              np.array([r[1] for r in rows], dtype=np.float64))
+
+if __name__ == "__main__":
+    from src.utils.data_loader import SQLITE_PATH
+    db_path = sys.argv[1] if len(sys.argv) > 1 else SQLITE_PATH
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            fitted = refit_sqlite(conn)
+    finally:
+        conn.close()
+    print(f"Fitted production forecasts for {fitted} sites in {db_path}")
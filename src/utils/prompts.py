@@ -0,0 +1,73 @@
+"""
+"Already prompted" markers.
+
+Nodes that ask the customer something record it in State.prompts when they
+emit the prompt and check that dict on re-entry, instead of scanning the whole
+message history for the prompt text on every turn.
+
+Threads checkpointed before the markers existed have no "prompts" key; for
+those the old substring scan is the fallback, and the first marker a node
+writes carries every prompt found in the history, so later turns are O(1).
+"""
+from typing import Dict, Optional
+
+# key -> (substring the old guard looked for, case-insensitive match)
+PROMPTS = {
+    "greeting": ("help you today?", False),
+    "sales_greeting": ("how can we help with your solar plans", True),
+    "past_proposals": ("Here are your past proposals", False),
+    "sales_name": ("provide your full name", True),
+    "sales_contact_complement": ("provide your", True),
+    "sales_postal_code": ("postal code and city", True),
+    "sales_segment": ("Are you a Residential, Commercial", False),
+    "sales_monthly_bill": ("average monthly electricity bill", True),
+    "sales_consumption_increase": ("expect your electricity consumption", True),
+    "sales_solution_count": ("How many solution options", False),
+    "sales_brand": ("brand preferences", False),
+    "sales_budget_tier": ("prefer Premium, Standard", False),
+    "service_status": ("Let me quickly check", False),
+    "service_issue_category": ("Please select the category", False),
+    "service_issue_description": ("Please describe the issue", False),
+    "live_chat_offer": ("Would you like to start a live chat", False),
+}
+
+def merge_prompts(left: Optional[Dict[str, bool]], right: Optional[Dict[str, bool]]) -> Dict[str, bool]:
+    """State.prompts reducer: markers are only ever added."""
+    return {**(left or {}), **(right or {})}
+
+def _content(m) -> str:
+    if isinstance(m, str):
+        return m
+    if isinstance(m, dict):
+        return str(m.get("content") or m.get("text") or "")
+    return ""
+
+def _matches(key: str, content: str) -> bool:
+    needle, lower = PROMPTS[key]
+    return needle in (content.lower() if lower else content)
+
+def migrate_prompts(messages) -> Dict[str, bool]:
+    """Markers for every prompt in a pre-marker message history, in one pass."""
+    found = {}
+    for m in messages or []:
+        content = _content(m)
+        for key in PROMPTS:
+            if key not in found and _matches(key, content):
+                found[key] = True
+    return found
+
+def already_prompted(state, key: str) -> bool:
+    prompts = state.get("prompts")
+    if prompts is not None:
+        return key in prompts
+    # Legacy thread: fall back to scanning the history
+    return any(_matches(key, _content(m)) for m in state.get("messages", []))
+
+def mark_prompted(state, *keys: str) -> Dict[str, bool]:
+    """
+    The State.prompts update for a node emitting `keys`. On a legacy thread it
+    also carries the markers for prompts already in the history.
+    """
+    marks = migrate_prompts(state.get("messages")) if state.get("prompts") is None else {}
+    marks.update((key, True) for key in keys)
+    return marks
@@ -0,0 +1,122 @@
+"""
+Admission control for graph runs in app.py.
+
+Runs on the same thread execute one at a time in arrival order (asyncio.Lock
+is FIFO), so a double click or client retry waits for the first turn instead
+of interleaving with it. Across threads at most `max_running` graph runs are
+in flight; up to `max_waiting` more queue for at most `max_wait_seconds`, and
+anything beyond that is turned away so the caller can answer 429. A run whose
+thread is idle while a slot is free is admitted at once and never counts
+against the queue.
+"""
+import asyncio
+from typing import Dict, List, Optional
+from starlette.responses import StreamingResponse
+
+class RunSlot:
+    """
+    A thread's turn plus one global run slot; release() is safe to call twice.
+    """
+    def __init__(self, admission: "RunAdmission", thread_id: str):
+        self.admission = admission
+        self.thread_id = thread_id
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.admission._release(self.thread_id)
+
+class RunAdmission:
+    def __init__(self, max_running: int = 16, max_waiting: int = 64, max_wait_seconds: float = 10):
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        self.max_wait_seconds = max_wait_seconds
+        self._slots = asyncio.Semaphore(max_running)
+        self._threads: Dict[str, List] = {} # thread_id -> [lock, holders + waiters]
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def enter(self, thread_id: str) -> Optional[RunSlot]:
+        """
+        Wait for this thread's previous runs and a free run slot. None when saturated.
+        """
+        if thread_id not in self._threads and not self._slots.locked():
+            # Nothing to wait for: neither acquire below suspends
+            entry = self._threads[thread_id] = [asyncio.Lock(), 1]
+            await entry[0].acquire()
+            await self._slots.acquire()
+            return self._admit(thread_id)
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            return None
+        entry = self._threads.setdefault(thread_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        self.waiting += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_seconds
+        have_thread = have_slot = False
+        try:
+            await asyncio.wait_for(entry[0].acquire(), self.max_wait_seconds)
+            have_thread = True
+            await asyncio.wait_for(self._slots.acquire(), max(0, deadline - loop.time()))
+            have_slot = True
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiting -= 1
+            if not have_slot:
+                if have_thread:
+                    entry[0].release()
+                self._forget(thread_id)
+        if not have_slot:
+            self.rejected += 1
+            return None
+        return self._admit(thread_id)
+
+    def _admit(self, thread_id: str) -> RunSlot:
+        self.running += 1
+        self.admitted += 1
+        return RunSlot(self, thread_id)
+
+    def _forget(self, thread_id: str):
+        entry = self._threads[thread_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._threads[thread_id]
+
+    def _release(self, thread_id: str):
+        self.running -= 1
+        self._slots.release()
+        self._threads[thread_id][0].release()
+        self._forget(thread_id)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_running": self.max_running,
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+class RunStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that frees its run slot however the response ends,
+    including a client that disconnects before the stream even starts.
+    """
+    def __init__(self, content, slot: RunSlot, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                self.slot.release()
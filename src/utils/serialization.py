@@ -0,0 +1,92 @@
+"""
+JSON encoding for SSE frames and state responses.
+
+Uses orjson when it's installed and falls back to the stdlib json module.
+Thread states are dominated by their message lists, and messages are
+immutable once normalized (src/utils/messages.py), so:
+
+- each message, including its static option-button list, is encoded once and
+  kept as a pre-encoded fragment keyed by message id;
+- a run's successive snapshots share an `encoded` list, so each frame only
+  encodes the messages the last step appended and splices in the rest.
+"""
+import json
+from typing import Dict, List, Optional
+from src.utils.messages import MessageLog, is_canonical
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODER = "orjson" if orjson is not None else "json"
+MESSAGE_CACHE_SIZE = 100_000
+
+_message_cache: Dict[str, tuple] = {} # message id -> (message, encoded bytes)
+
+def _default(obj):
+    if isinstance(obj, MessageLog):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+def dumps(obj) -> str:
+    return dumps_bytes(obj).decode()
+
+def encode_message(m) -> bytes:
+    cached = _message_cache.get(m.get("id")) if isinstance(m, dict) else None
+    if cached is not None and cached[0] == m:
+        return cached[1]
+    encoded = dumps_bytes(m)
+    if is_canonical(m):
+        if len(_message_cache) >= MESSAGE_CACHE_SIZE:
+            _message_cache.clear()
+        _message_cache[m["id"]] = (m, encoded)
+    return encoded
+
+def encode_messages(messages: List, encoded: Optional[List[bytes]] = None) -> bytes:
+    """
+    `encoded` holds fragments for a prefix of `messages` from an earlier frame of
+    the same run; it's extended in place with the new ones.
+    """
+    if encoded is None:
+        encoded = []
+    encoded.extend(encode_message(m) for m in messages[len(encoded):])
+    return b"[" + b",".join(encoded) + b"]"
+
+def _splice(head: bytes, key: str, fragment: bytes) -> bytes:
+    """Add `"key": fragment` to an already encoded JSON object."""
+    sep = b"" if head == b"{}" else b","
+    return head[:-1] + sep + dumps_bytes(key) + b":" + fragment + b"}"
+
+def encode(obj, encoded_messages: Optional[List[bytes]] = None) -> bytes:
+    """
+    Encode an API payload. Message lists (under "messages", including inside a
+    nested "values" state) are assembled from fragments.
+    """
+    if orjson is not None and encoded_messages is None:
+        # One-shot payload: a single orjson call beats per-message lookups
+        return dumps_bytes(obj)
+    if isinstance(obj, list):
+        return b"[" + b",".join(encode(x) for x in obj) + b"]"
+    if not isinstance(obj, dict):
+        return dumps_bytes(obj)
+    messages = obj.get("messages")
+    values = obj.get("values")
+    if not isinstance(messages, (list, MessageLog)) and not isinstance(values, dict):
+        return dumps_bytes(obj)
+    rest = {k: v for k, v in obj.items() if k not in ("messages", "values")}
+    out = dumps_bytes(rest)
+    if "values" in obj:
+        out = _splice(out, "values", encode(values, encoded_messages))
+    if "messages" in obj:
+        out = _splice(out, "messages", encode_messages(messages, encoded_messages) if isinstance(messages, (list, MessageLog)) else dumps_bytes(messages))
+    return out
+
+def sse_event(event: str, data, event_id: Optional[str] = None, encoded_messages: Optional[List[bytes]] = None) -> bytes:
+    head = f"event: {event}\n" + (f"id: {event_id}\n" if event_id is not None else "")
+    return head.encode() + b"data: " + encode(data, encoded_messages) + b"\n\n"
@@ -0,0 +1,217 @@
+"""
+Bounded thread-session storage for app.py.
+
+Keeps at most `max_resident` sessions in memory, least recently used first out,
+and also evicts any session idle for longer than `idle_ttl` seconds. Evicted
+sessions go to a spill target (anything with save/load/delete/ids: DiskSpill,
+or checkpointer.CheckpointSpill) and are rehydrated transparently the next
+time the thread is touched.
+"""
+import base64
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+from src.utils.serialization import dumps_bytes
+
+class DiskSpill:
+    """
+    One compressed JSON file per thread, named by the urlsafe-base64 thread id.
+    """
+    SUFFIX = ".json.z"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, thread_id: str) -> str:
+        name = base64.urlsafe_b64encode(thread_id.encode()).decode()
+        return os.path.join(self.directory, name + self.SUFFIX)
+
+    def save(self, thread_id: str, state: Dict):
+        path = self._path(thread_id)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(dumps_bytes(state), 6))
+        os.replace(tmp, path)
+
+    def load(self, thread_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(thread_id), "rb") as f:
+                return json.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, thread_id: str):
+        try:
+            os.remove(self._path(thread_id))
+        except FileNotFoundError:
+            pass
+
+    def ids(self) -> List[str]:
+        return [
+            base64.urlsafe_b64decode(name[:-len(self.SUFFIX)].encode()).decode()
+            for name in os.listdir(self.directory) if name.endswith(self.SUFFIX)
+        ]
+
+class SessionStore:
+    """
+    Dict-like session map with a bounded resident set and hit/miss/eviction counters.
+
+    With `versions` (a thread_versions.ThreadVersions shared by every worker),
+    resident entries are checked against the shared version on each read and
+    reloaded from the spill target when another worker has moved the thread on.
+    """
+    def __init__(self, max_resident: int = 1000, idle_ttl: float = 1800, spill=None, versions=None):
+        self.max_resident = max_resident
+        self.idle_ttl = idle_ttl
+        self.spill = spill
+        self.versions = versions
+        self._resident: "OrderedDict[str, Dict]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._stamps: Dict[str, Optional[int]] = {}
+        # Without a shared registry, track what we spilled ourselves
+        self._spilled = set(spill.ids()) if spill and versions is None else set()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def _version(self, thread_id: str) -> Optional[int]:
+        return self.versions.current(thread_id) if self.versions else None
+
+    def _known(self, thread_id: str) -> bool:
+        if self.versions:
+            return self._version(thread_id) is not None
+        return thread_id in self._spilled
+
+    def _store(self, thread_id: str, state: Dict, version: Optional[int]):
+        self._resident[thread_id] = state
+        self._stamps[thread_id] = version
+        self._resident.move_to_end(thread_id)
+        self._last_access[thread_id] = time.monotonic()
+
+    def _drop(self, thread_id: str) -> Dict:
+        del self._last_access[thread_id]
+        del self._stamps[thread_id]
+        return self._resident.pop(thread_id)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._resident:
+            oldest = next(iter(self._resident))
+            over_capacity = len(self._resident) > self.max_resident
+            idle = now - self._last_access[oldest] > self.idle_ttl
+            if not (over_capacity or idle):
+                break
+            state = self._drop(oldest)
+            if self.spill:
+                self.spill.save(oldest, state)
+                if self.versions is None:
+                    self._spilled.add(oldest)
+            self.evictions += 1
+
+    def _rehydrate(self, thread_id: str) -> Optional[Dict]:
+        if not self.spill or not self._known(thread_id):
+            return None
+        # Read the version first: if the thread moves on while we load, the stamp is already behind
+        version = self._version(thread_id)
+        state = self.spill.load(thread_id)
+        self._spilled.discard(thread_id)
+        self.spill.delete(thread_id)
+        if state is None:
+            return None
+        self.rehydrations += 1
+        self._store(thread_id, state, version)
+        return state
+
+    def get(self, thread_id: str, default=None):
+        with self._lock:
+            state = None
+            if thread_id in self._resident:
+                if self.versions and self._version(thread_id) != self._stamps[thread_id]:
+                    # Another worker ran a turn on this thread since we cached it
+                    self.stale += 1
+                    stale_state = self._drop(thread_id)
+                    state = self._rehydrate(thread_id) or stale_state
+                else:
+                    self.hits += 1
+                    state = self._resident[thread_id]
+                    self._last_access[thread_id] = time.monotonic()
+                    self._resident.move_to_end(thread_id)
+            else:
+                self.misses += 1
+                state = self._rehydrate(thread_id)
+            self._evict()
+            return default if state is None else state
+
+    def peek(self, thread_id: str, default=None):
+        """
+        Read a session without counting it as a use (listing endpoints).
+        """
+        with self._lock:
+            if thread_id in self._resident and self._version(thread_id) == self._stamps[thread_id]:
+                return self._resident[thread_id]
+            if self.spill and self._known(thread_id):
+                state = self.spill.load(thread_id)
+                if state is not None:
+                    return state
+            return self._resident.get(thread_id, default)
+
+    def put(self, thread_id: str, state: Dict, version: Optional[int] = None):
+        """
+        Cache a thread's state as of `version` (default: the current shared version).
+        """
+        with self._lock:
+            if thread_id in self._spilled:
+                self._spilled.discard(thread_id)
+                self.spill.delete(thread_id)
+            self._store(thread_id, state, self._version(thread_id) if version is None else version)
+            self._evict()
+
+    def __getitem__(self, thread_id: str) -> Dict:
+        state = self.get(thread_id)
+        if state is None:
+            raise KeyError(thread_id)
+        return state
+
+    def __setitem__(self, thread_id: str, state: Dict):
+        self.put(thread_id, state)
+
+    def __contains__(self, thread_id: str) -> bool:
+        with self._lock:
+            return thread_id in self._resident or self._known(thread_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self.versions:
+                return self.versions.count()
+            return len(self._resident) + len(self._spilled)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            if self.versions:
+                return self.versions.ids()
+            return list(self._resident.keys()) + list(self._spilled)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "resident": len(self._resident),
+                "spilled": len(self) - len(self._resident),
+                "max_resident": self.max_resident,
+                "idle_ttl_seconds": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+            }
@@ -0,0 +1,191 @@
+"""
+Fleet-wide site status view.
+
+service_status_check used to decide a site's health per request: the site
+row's issue_flag, then a Python loop averaging its weekly_metrics rows. This
+builds one status record per site for the whole fleet at once, with the
+metric aggregates computed as numpy group sums over every metric row, so the
+node is a dict lookup. The weekly figures cover each site's last WEEK_DAYS
+days of readings, not its whole history; the under-producing flag looks
+back YIELD_WINDOW_DAYS. The memory backend rebuilds it with each data
+snapshot (i.e. when the CSVs reload); the SQLite backend in the background
+once the database changes, at most every SITE_STATUS_TTL seconds.
+
+Each record also carries the expected-yield score from
+src.utils.yield_anomaly (expected production, actual/expected ratio and the
+under-producing flag) and the site's own forecast for the week's weather
+(src.utils.production_forecast), computed in the same pass.
+
+Issue sources: sites.csv's issue_flag is what the status check has always
+reported and stays authoritative. site_issues.csv's flag rides along as
+reported_issue_*, with issue_conflict set where the two disagree.
+"""
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from src.utils.metrics_query import WEEK_DAYS, parse_days
+from src.utils.yield_anomaly import YIELD_WINDOW_DAYS, expected_yield, score_yield
+from src.utils.production_forecast import ProductionForecast, forecast_week
+
+SITE_STATUS_TTL = float(os.environ.get("SITE_STATUS_TTL", "60"))
+# Trailing days of each site's readings the view needs
+RECENT_DAYS = max(WEEK_DAYS, YIELD_WINDOW_DAYS)
+
+# weekly_metrics columns the view aggregates
+METRIC_COLUMNS = ("site_id", "date", "production_kwh", "cloudiness_percentage", "performance_score")
+
+def _flag(value) -> bool:
+    return str(value).lower() == "true"
+
+def _text(value) -> Optional[str]:
+    # Blank CSV cells come back as NaN
+    return None if value is None or (isinstance(value, float) and value != value) else value
+
+def _cells(values: np.ndarray, present: np.ndarray) -> List:
+    """Array values as Python scalars, None where not `present`."""
+    return [v if p else None for v, p in zip(values.tolist(), present.tolist())]
+
+def _group_sum(codes: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    return np.bincount(codes, weights=values, minlength=n)
+
+def _size(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def aggregate_metrics(metrics: Dict[str, np.ndarray], size_kw: Optional[Dict[str, float]] = None,
+                      forecast: Optional[ProductionForecast] = None) -> Dict[str, Dict]:
+    """
+    Per-site row count, latest date, performance_score trend (least-squares
+    slope over all readings, points per day), and over the last WEEK_DAYS
+    days of readings: production total, mean cloudiness, expected production
+    for system size `size_kw` (by site) and `forecast` production. The yield
+    ratio and under-producing flag are over the last YIELD_WINDOW_DAYS. From the
+    weekly_metrics columns in METRIC_COLUMNS; NaN cells are skipped.
+    """
+    if not len(metrics["site_id"]):
+        return {}
+    # Factorize before stringifying: there are far fewer sites than rows
+    codes, uniques = pd.factorize(np.asarray(metrics["site_id"]))
+    sites = [str(site) for site in uniques.tolist()]
+    n = len(sites)
+    days = parse_days(metrics["date"])
+    latest = pd.Series(days).groupby(codes).max().reindex(range(n)).to_numpy()
+    week = ~np.isnan(days) & (days > latest[codes] - WEEK_DAYS)
+    week_codes = codes[week]
+    scored = ~np.isnan(days) & (days > latest[codes] - YIELD_WINDOW_DAYS)
+
+    def summed(values: np.ndarray):
+        valid = ~np.isnan(values)
+        return _group_sum(week_codes, np.where(valid, values, 0.0), n), _group_sum(week_codes, valid.astype(np.float64), n)
+
+    all_production = np.asarray(metrics["production_kwh"], dtype=np.float64)
+    all_cloudiness = np.asarray(metrics["cloudiness_percentage"], dtype=np.float64)
+    production_kwh, cloudiness_pct = all_production[week], all_cloudiness[week]
+    production, production_n = summed(production_kwh)
+    cloudiness, cloudiness_n = summed(cloudiness_pct)
+    sizes = np.array([_size((size_kw or {}).get(site)) for site in sites], dtype=np.float64)
+    score = score_yield(codes[scored], sizes, all_production[scored], all_cloudiness[scored])
+    # Shown next to the week's production, so over the week's readings
+    expected, expected_n = expected_yield(score["curve"], week_codes, sizes, production_kwh, cloudiness_pct)
+    if forecast is not None:
+        forecast_kwh, forecast_n = forecast_week(forecast, week_codes, sites, sizes, days[week], cloudiness_pct)
+    else:
+        forecast_kwh, forecast_n = np.zeros(n), np.zeros(n)
+
+    # Slope of score over date per site: centre both on the site means, then sum(dx*dy) / sum(dx*dx)
+    performance = np.asarray(metrics["performance_score"], dtype=np.float64)
+    valid = ~np.isnan(performance) & ~np.isnan(days)
+    x, y = np.where(valid, days, 0.0), np.where(valid, performance, 0.0)
+    counted = _group_sum(codes, valid.astype(np.float64), n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dx = np.where(valid, x - (_group_sum(codes, x, n) / counted)[codes], 0.0)
+        dy = np.where(valid, y - (_group_sum(codes, y, n) / counted)[codes], 0.0)
+        slope = _group_sum(codes, dx * dy, n) / _group_sum(codes, dx * dx, n)
+        mean_cloudiness = cloudiness / cloudiness_n
+
+    has_date = ~np.isnan(latest)
+    latest_dates = np.where(has_date, latest, 0).astype(np.int64).astype("datetime64[D]").astype(str)
+
+    columns = {
+        "metric_count": np.bincount(codes, minlength=n).tolist(),
+        "week_readings": np.bincount(week_codes, minlength=n).tolist(),
+        "weekly_production_kwh": _cells(production, production_n > 0),
+        "avg_cloudiness": _cells(mean_cloudiness, cloudiness_n > 0),
+        "last_metric_date": _cells(latest_dates, has_date),
+        "performance_score_trend": _cells(slope, np.isfinite(slope)),
+        "expected_production_kwh": _cells(expected, expected_n > 0),
+        "yield_ratio": _cells(score["ratio"], np.isfinite(score["ratio"])),
+        "underproducing": score["underproducing"].tolist(),
+        "forecast_kwh": _cells(forecast_kwh, forecast_n > 0),
+    }
+    names = list(columns)
+    return {site: dict(zip(names, cells)) for site, cells in zip(sites, zip(*columns.values()))}
+
+EMPTY_METRICS = {"metric_count": 0, "week_readings": 0, "weekly_production_kwh": None, "avg_cloudiness": None,
+                 "last_metric_date": None, "performance_score_trend": None,
+                 "expected_production_kwh": None, "yield_ratio": None, "underproducing": False, "forecast_kwh": None}
+
+def metric_totals(rows: List[tuple]) -> Dict[str, Dict]:
+    """
+    metric_count and performance_score_trend per site from running sums:
+    (site_id, readings, scored, sum_x, sum_y, sum_xx, sum_xy) rows, x being
+    the day and y the score of each reading with both.
+    """
+    if not rows:
+        return {}
+    site_id, readings, n, sx, sy, sxx, sxy = (np.array(col, dtype=object if i == 0 else np.float64) for i, col in enumerate(zip(*rows)))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    trends = _cells(slope, np.isfinite(slope) & (n > 1))
+    return {str(site): {"metric_count": int(count), "performance_score_trend": trend}
+            for site, count, trend in zip(site_id.tolist(), readings.tolist(), trends)}
+
+def size_by_site(sites: List[Dict]) -> Dict[str, float]:
+    """system_size_kw by str(site_id), first row per site."""
+    return {str(site["site_id"]): site.get("system_size_kw") for site in reversed(sites)}
+
+def build_site_status(sites: List[Dict], issues: List[Dict], metrics: Dict[str, np.ndarray],
+                      totals: Optional[Dict[str, Dict]] = None, forecast: Optional[ProductionForecast] = None) -> Dict[str, Dict]:
+    """
+    One status record per site, keyed by str(site_id). The first row per site
+    wins, as in the site lookup. With `totals` (metric_totals, maintained as
+    metrics are ingested), `metrics` only needs each site's last RECENT_DAYS
+    days of rows.
+    """
+    aggregates = aggregate_metrics(metrics, size_by_site(sites), forecast)
+    for site_id, figures in (totals or {}).items():
+        if site_id in aggregates:
+            aggregates[site_id].update(figures)
+    reported = {}
+    for issue in issues:
+        reported.setdefault(str(issue["site_id"]), issue)
+
+    view = {}
+    for site in sites:
+        site_id = str(site["site_id"])
+        if site_id in view:
+            continue
+        issue = reported.get(site_id) or {}
+        issue_flag, reported_flag = _flag(site.get("issue_flag")), _flag(issue.get("issue_flag"))
+        view[site_id] = {
+            "site_id": site_id,
+            "issue_flag": issue_flag,
+            "issue_text": _text(site.get("issue_text")),
+            "recommended_action_text": _text(site.get("recommended_action_text")),
+            "reported_issue_flag": reported_flag,
+            "reported_issue_text": _text(issue.get("issue_text")),
+            "reported_action_text": _text(issue.get("recommended_action_text")),
+            "issue_conflict": bool(issue) and issue_flag != reported_flag,
+            **aggregates.get(site_id, EMPTY_METRICS),
+        }
+    return view
+
+def metric_columns(rows: List[Dict]) -> Dict[str, np.ndarray]:
+    """METRIC_COLUMNS as arrays, from metric rows as dicts."""
+    return {
+        name: np.array([row.get(name) for row in rows], dtype=object if name in ("site_id", "date") else np.float64)
+        for name in METRIC_COLUMNS
+    }
@@ -0,0 +1,405 @@
+"""
+SQLite storage backend for data_loader.
+
+Serves the same queries as the in-memory store from an indexed local database.
+Each thread gets its own connection (WAL mode, so readers in every worker
+process run concurrently with a writer), and all queries are fixed SQL strings
+so sqlite3's per-connection statement cache keeps them prepared.
+
+Import or refresh the database from supportingData with:
+    python -m src.utils.sqlite_backend [db_path]
+"""
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from src.utils.data_store import clean_record
+from src.utils.site_status import RECENT_DAYS, SITE_STATUS_TTL, build_site_status, metric_columns, metric_totals
+from src.utils.production_forecast import ProductionForecast, load_sqlite as load_forecast, refit_sqlite as refit_forecast
+from src.utils.metrics_query import check_query, day_str, downsample, parse_days, periods_back, to_day
+
+# CSVs imported into the database and the columns we query them by.
+# Key columns are stored as TEXT of the value so `col = ?` keeps the old
+# `.astype(str) == str(x)` semantics while still using the index.
+SQLITE_TABLES: Dict[str, List[List[str]]] = {
+    "customers.csv": [["email"], ["phone"]],
+    "sites.csv": [["site_id"]],
+    "weekly_metrics.csv": [["site_id", "date"], ["metric_id"]],
+    "proposals.csv": [["customer_id"]],
+    "email_otp.csv": [["email", "otp"]],
+    "sms_otp.csv": [["phone", "otp"]],
+    "agent_availability.csv": [["department"]],
+    "proposal_template.csv": [],
+    "site_issues.csv": [["site_id"]],
+    "service_tickets.csv": [["customer_id"], ["site_id"]],
+    "crm_opportunities.csv": [["prospect_id"]],
+}
+
+SQL_CUSTOMER = "SELECT * FROM customers WHERE email = ? OR phone = ? ORDER BY rowid LIMIT 1"
+SQL_SITE = "SELECT * FROM sites WHERE site_id = ? ORDER BY rowid LIMIT 1"
+SQL_METRICS = "SELECT * FROM weekly_metrics WHERE site_id = ? ORDER BY rowid"
+SQL_PROPOSALS = "SELECT * FROM proposals WHERE customer_id = ? ORDER BY rowid"
+SQL_EMAIL_OTP = "SELECT 1 FROM email_otp WHERE email = ? AND otp = ? LIMIT 1"
+SQL_SMS_OTP = "SELECT 1 FROM sms_otp WHERE phone = ? AND otp = ? LIMIT 1"
+SQL_AGENTS_ONLINE = "SELECT 1 FROM agent_availability WHERE department = ? AND is_online = 1 LIMIT 1"
+SQL_TEMPLATES = "SELECT * FROM proposal_template ORDER BY rowid"
+SQL_SITE_ISSUES = "SELECT * FROM site_issues ORDER BY rowid"
+SQL_SITES = "SELECT * FROM sites ORDER BY rowid"
+# ISO dates compare as text, so date ranges are index range scans on (site_id, date)
+SQL_METRICS_RANGE = "SELECT * FROM weekly_metrics WHERE site_id = ? AND date >= ? AND date <= ? ORDER BY date, rowid"
+SQL_METRICS_LAST = "SELECT * FROM weekly_metrics WHERE site_id = ? AND date >= ? AND date <= ? ORDER BY date DESC, rowid DESC LIMIT ?"
+SQL_METRICS_LATEST = "SELECT MAX(date) FROM weekly_metrics WHERE site_id = ? AND date >= ? AND date <= ?"
+SQL_OPEN_TICKETS = "SELECT * FROM service_tickets WHERE customer_id = ? AND status IN ('Open', 'In Progress') ORDER BY rowid"
+SQL_KINDS = "SELECT table_name, column_name, kind FROM _column_kinds ORDER BY table_name, position"
+
+# Per-site running aggregates of weekly_metrics, kept up to date by imports and
+# src.utils.metrics_ingest so the status view never re-reads full history.
+# x is a dated reading's day (since 1970-01-01), y its performance_score; the
+# sums over readings with both give the score trend by least squares.
+SQL_TOTALS_CREATE = """
+CREATE TABLE IF NOT EXISTS site_metric_totals (
+    site_id TEXT PRIMARY KEY, readings INTEGER, last_date TEXT,
+    scored INTEGER, sum_x REAL, sum_y REAL, sum_xx REAL, sum_xy REAL
+)
+"""
+SQL_TOTALS_REBUILD = """
+INSERT INTO site_metric_totals
+SELECT site_id, COUNT(*), MAX(CASE WHEN x IS NOT NULL THEN date END), COUNT(x * y),
+       TOTAL(CASE WHEN y IS NOT NULL THEN x END), TOTAL(CASE WHEN x IS NOT NULL THEN y END),
+       TOTAL(CASE WHEN y IS NOT NULL THEN x * x END), TOTAL(x * y)
+FROM (SELECT site_id, date, julianday(date) - 2440587.5 AS x, performance_score AS y FROM weekly_metrics)
+GROUP BY site_id
+"""
+SQL_TOTALS_UPSERT = """
+INSERT INTO site_metric_totals VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(site_id) DO UPDATE SET
+    readings = readings + excluded.readings,
+    last_date = CASE WHEN last_date IS NULL OR excluded.last_date > last_date THEN excluded.last_date ELSE last_date END,
+    scored = scored + excluded.scored,
+    sum_x = sum_x + excluded.sum_x, sum_y = sum_y + excluded.sum_y,
+    sum_xx = sum_xx + excluded.sum_xx, sum_xy = sum_xy + excluded.sum_xy
+"""
+SQL_SITE_FORECAST = "SELECT intercept, cloudiness, season_sin, season_cos FROM site_forecast WHERE site_id = ?"
+SQL_TOTALS = "SELECT site_id, readings, scored, sum_x, sum_y, sum_xx, sum_xy FROM site_metric_totals"
+# Each site's last RECENT_DAYS days of readings, as range scans on (site_id, date)
+SQL_RECENT_METRICS = f"""
+SELECT m.site_id, m.date, m.production_kwh, m.cloudiness_percentage, m.performance_score
+FROM site_metric_totals t JOIN weekly_metrics m
+  ON m.site_id = t.site_id AND m.date > date(t.last_date, '-{RECENT_DAYS} days') AND m.date <= t.last_date
+"""
+
+def _table_name(filename: str) -> str:
+    return os.path.splitext(filename)[0]
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "text"
+
+SQL_TYPES = {"bool": "INTEGER", "int": "INTEGER", "float": "REAL", "text": "TEXT"}
+
+def _encode(value, kind: str, is_key: bool):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if is_key:
+        return str(value)
+    if kind == "bool":
+        return int(bool(value))
+    return value.item() if hasattr(value, "item") else value
+
+def _decoder(kind: str, is_key: bool) -> Callable:
+    def decode(value):
+        if value is None:
+            return float("nan")
+        if kind == "bool":
+            return value in (1, "1", "True", "true")
+        if kind == "int" and is_key:
+            return int(value)
+        if kind == "float" and is_key:
+            return float(value)
+        return value
+    return decode
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def import_csvs(db_path: str, path_resolver: Callable[[str], str], replace: bool = True):
+    """
+    Load the supportingData CSVs into the database in one transaction, so
+    readers keep seeing the previous tables until the import commits.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = '_column_kinds'").fetchone()
+        if exists and not replace:
+            conn.rollback()
+            return
+        conn.execute("CREATE TABLE IF NOT EXISTS _column_kinds (table_name TEXT, column_name TEXT, kind TEXT, position INTEGER)")
+        for filename, indexes in SQLITE_TABLES.items():
+            name = _table_name(filename)
+            df = pd.read_csv(path_resolver(filename))
+            keys = {col for index in indexes for col in index}
+            kinds = [(col, _column_kind(df[col])) for col in df.columns]
+
+            conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            conn.execute("DELETE FROM _column_kinds WHERE table_name = ?", (name,))
+            cols_sql = ", ".join(f'"{col}" {"TEXT" if col in keys else SQL_TYPES[kind]}' for col, kind in kinds)
+            conn.execute(f'CREATE TABLE "{name}" ({cols_sql})')
+            conn.executemany(
+                "INSERT INTO _column_kinds VALUES (?, ?, ?, ?)",
+                [(name, col, kind, pos) for pos, (col, kind) in enumerate(kinds)]
+            )
+            placeholders = ", ".join("?" for _ in kinds)
+            rows = [
+                tuple(_encode(v, kind, col in keys) for v, (col, kind) in zip(row, kinds))
+                for row in df.itertuples(index=False, name=None)
+            ]
+            conn.executemany(f'INSERT INTO "{name}" VALUES ({placeholders})', rows)
+            for index in indexes:
+                cols = ", ".join(f'"{c}"' for c in index)
+                conn.execute(f'CREATE INDEX "idx_{name}_{"_".join(index)}" ON "{name}" ({cols})')
+        conn.execute("DROP TABLE IF EXISTS site_metric_totals")
+        conn.execute(SQL_TOTALS_CREATE)
+        conn.execute(SQL_TOTALS_REBUILD)
+        refit_forecast(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+class SqliteBackend:
+    """
+    data_loader backend serving lookups from a local SQLite database with a
+    per-thread connection pool.
+    """
+    name = "sqlite"
+
+    def __init__(self, db_path: str, path_resolver: Callable[[str], str]):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._site_status: Optional[Dict[str, Dict]] = None
+        self._site_status_lock = threading.Lock() # One rebuild at a time
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # First worker to start builds the database from the CSVs
+        import_csvs(db_path, path_resolver, replace=False)
+        self._ensure_schema()
+        self._columns = self._load_columns()
+        self._decoders = {
+            table: {col: _decoder(kind, is_key) for col, (kind, is_key) in cols.items()}
+            for table, cols in self._columns.items()
+        }
+
+    def _ensure_schema(self):
+        # Databases imported before an index or the totals table existed get them here
+        conn = self._conn()
+        with conn:
+            # Workers start together: hold the write lock from the checks to the builds
+            conn.execute("BEGIN IMMEDIATE")
+            for filename, indexes in SQLITE_TABLES.items():
+                name = _table_name(filename)
+                for index in indexes:
+                    cols = ", ".join(f'"{c}"' for c in index)
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{name}_{"_".join(index)}" ON "{name}" ({cols})')
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'site_metric_totals'").fetchone() is None:
+                conn.execute(SQL_TOTALS_CREATE)
+                conn.execute(SQL_TOTALS_REBUILD)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'site_forecast'").fetchone() is None:
+                refit_forecast(conn)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _connect(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def _load_columns(self) -> Dict[str, Dict[str, tuple]]:
+        keys = {
+            _table_name(filename): {col for index in indexes for col in index}
+            for filename, indexes in SQLITE_TABLES.items()
+        }
+        columns: Dict[str, Dict[str, tuple]] = {}
+        for table, col, kind in self._conn().execute(SQL_KINDS):
+            columns.setdefault(table, {})[col] = (kind, col in keys.get(table, set()))
+        return columns
+
+    def _rows(self, table: str, sql: str, params=()) -> List[Dict]:
+        cursor = self._conn().execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        decoders = self._decoders[table]
+        return [{n: decoders[n](v) for n, v in zip(names, row)} for row in cursor.fetchall()]
+
+    def _exists(self, sql: str, params) -> bool:
+        return self._conn().execute(sql, params).fetchone() is not None
+
+    def customer_by_identifier(self, identifier: str) -> Optional[Dict]:
+        rows = self._rows("customers", SQL_CUSTOMER, (str(identifier), str(identifier)))
+        return rows[0] if rows else None
+
+    def site_by_id(self, site_id: str) -> Optional[Dict]:
+        rows = self._rows("sites", SQL_SITE, (str(site_id),))
+        return rows[0] if rows else None
+
+    def metrics_by_site(self, site_id: str) -> List[Dict]:
+        return self._rows("weekly_metrics", SQL_METRICS, (str(site_id),))
+
+    def proposals_by_customer(self, customer_id: str) -> List[Dict]:
+        return self._rows("proposals", SQL_PROPOSALS, (str(customer_id),))
+
+    def query_metrics(self, site_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                      period: Optional[str] = None, last: Optional[int] = None) -> List[Dict]:
+        check_query(period, last)
+        site = str(site_id)
+        low = day_str(to_day(start)) if start is not None else "0000-01-01"
+        high = day_str(to_day(end)) if end is not None else "9999-12-31"
+        if last is not None and period is None:
+            rows = self._rows("weekly_metrics", SQL_METRICS_LAST, (site, low, high, last))[::-1]
+        else:
+            if last is not None:
+                latest = self._conn().execute(SQL_METRICS_LATEST, (site, low, high)).fetchone()[0]
+                if latest is None:
+                    return []
+                low = max(low, day_str(periods_back(to_day(latest), period, last)))
+            rows = self._rows("weekly_metrics", SQL_METRICS_RANGE, (site, low, high))
+        if period is None:
+            return [clean_record(r) for r in rows]
+        columns = metric_columns(rows)
+        days = parse_days(columns["date"])
+        dated = ~np.isnan(days) # Like the memory index, readings without a date aren't counted
+        return downsample(days[dated].astype(np.int64), columns["production_kwh"][dated],
+                          columns["cloudiness_percentage"][dated], columns["performance_score"][dated], period)
+
+    def forecast_production(self, site_id: str, cloudiness: float, day: int) -> Optional[float]:
+        site = self.site_by_id(site_id)
+        row = self._conn().execute(SQL_SITE_FORECAST, (str(site_id),)).fetchone()
+        if not site or not row:
+            return None
+        forecast = ProductionForecast([str(site_id)], np.array([row], dtype=np.float64), np.ones(1))
+        return forecast.expected(site_id, site.get("system_size_kw"), day, cloudiness)
+
+    def otp_matches(self, identifier: str, otp: str, channel: str) -> bool:
+        sql = SQL_EMAIL_OTP if channel == "email" else SQL_SMS_OTP
+        return self._exists(sql, (str(identifier), str(otp)))
+
+    def agents_online(self, department: str) -> bool:
+        return self._exists(SQL_AGENTS_ONLINE, (department,))
+
+    def proposal_templates(self) -> List[Dict]:
+        return self._rows("proposal_template", SQL_TEMPLATES)
+
+    def site_issues(self) -> List[Dict]:
+        return self._rows("site_issues", SQL_SITE_ISSUES)
+
+    def _build_site_status(self) -> Dict[str, Dict]:
+        # Running totals plus the recent rows: no full-history scan
+        return build_site_status(self._rows("sites", SQL_SITES), self.site_issues(),
+                                 metric_columns(self._rows("weekly_metrics", SQL_RECENT_METRICS)),
+                                 metric_totals(self._conn().execute(SQL_TOTALS).fetchall()),
+                                 load_forecast(self._conn()))
+
+    def refresh_site_status(self):
+        """Rebuild the status view and swap it in; readers keep the previous one meanwhile."""
+        with self._site_status_lock:
+            self._site_status = self._build_site_status()
+
+    def site_status(self, site_id: str) -> Optional[Dict]:
+        view = self._site_status
+        if view is None:
+            with self._site_status_lock:
+                # Only the first read waits, for the watcher's first build or without a watcher
+                if self._site_status is None:
+                    self._site_status = self._build_site_status()
+                view = self._site_status
+        record = view.get(str(site_id))
+        return dict(record) if record else None
+
+    def customer_context(self, identifier: str) -> Optional[Dict]:
+        customer = self.customer_by_identifier(identifier)
+        if not customer:
+            return None
+        customer_id, site_id = str(customer["customer_id"]), str(customer["site_id"])
+        site = self.site_by_id(site_id)
+        return {
+            "customer": clean_record(customer),
+            "site": clean_record(site) if site else None,
+            "metrics": [clean_record(r) for r in self.metrics_by_site(site_id)],
+            "proposals": [clean_record(r) for r in self.proposals_by_customer(customer_id)],
+            "open_tickets": [clean_record(r) for r in self._rows("service_tickets", SQL_OPEN_TICKETS, (customer_id,))],
+        }
+
+    def _insert(self, table: str, record: Dict) -> bool:
+        columns = self._columns[table]
+        cols = [c for c in columns if c in record]
+        names = ", ".join(f'"{c}"' for c in cols)
+        placeholders = ", ".join("?" for _ in cols)
+        values = tuple(_encode(record[c], columns[c][0], columns[c][1]) for c in cols)
+        conn = self._conn()
+        with conn:
+            conn.execute(f'INSERT INTO "{table}" ({names}) VALUES ({placeholders})', values)
+        return True
+
+    def record_service_ticket(self, ticket: Dict) -> bool:
+        return self._insert("service_tickets", ticket)
+
+    def record_crm_opportunity(self, opportunity: Dict) -> bool:
+        return self._insert("crm_opportunities", opportunity)
+
+    def pinned(self):
+        return nullcontext()
+
+    def start_watcher(self, interval: float):
+        """
+        Build the status view in the background, then rebuild it when another
+        connection (an import, an ingest, any worker's writes) has committed,
+        at most every SITE_STATUS_TTL seconds.
+        """
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop.clear()
+
+        def watch():
+            seen, built_at = None, 0.0
+            while True:
+                version = self._conn().execute("PRAGMA data_version").fetchone()[0]
+                if version != seen and time.monotonic() - built_at >= SITE_STATUS_TTL:
+                    try:
+                        self.refresh_site_status()
+                        seen, built_at = version, time.monotonic()
+                    except Exception:
+                        traceback.print_exc() # Keep serving the previous view; retried next tick
+                if self._stop.wait(interval):
+                    return
+
+        self._watcher = threading.Thread(target=watch, name="site-status-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def describe(self) -> Dict:
+        return {"backend": self.name, "db_path": self.db_path}
+
+if __name__ == "__main__":
+    from src.utils.data_loader import SQLITE_PATH, get_csv_path
+    db_path = sys.argv[1] if len(sys.argv) > 1 else SQLITE_PATH
+    import_csvs(db_path, get_csv_path, replace=True)
+    print(f"Imported {len(SQLITE_TABLES)} tables into {db_path}")
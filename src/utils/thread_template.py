@@ -0,0 +1,33 @@
+"""
+Memoized state of a new thread.
+
+Every new thread starts in the same place: the blank initial state plus
+entry_node's greeting. That is computed once per process by running a
+checkpointer-less graph, and each new thread gets a clone instead of a graph
+run. Template threads are never checkpointed; their first run writes the
+first checkpoint. Every worker builds the same template, so a registered
+thread with no checkpoint is at the template state wherever it's read.
+"""
+import hashlib
+from typing import Callable, Dict
+from src.utils.messages import MessageLog
+from src.utils.serialization import dumps_bytes
+
+class ThreadTemplate:
+    def __init__(self, build: Callable[[], Dict]):
+        self.state = build()
+        # Identifies the template content (graph greeting + initial fields), e.g. in /debug/sessions
+        self.version = hashlib.sha1(dumps_bytes(self.state)).hexdigest()[:12]
+
+    def clone(self, thread_id: str) -> Dict:
+        """
+        The template for `thread_id`. Its containers are tiny and get their own
+        copies; message dicts are immutable once normalized and are shared.
+        """
+        state = {k: v.copy() if isinstance(v, (list, dict)) else v for k, v in self.state.items()}
+        state["session_id"] = thread_id
+        state["messages"] = MessageLog(self.state.get("messages", []))
+        return state
+
+    def stats(self) -> Dict:
+        return {"version": self.version, "messages": len(self.state.get("messages", []))}
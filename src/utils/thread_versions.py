@@ -0,0 +1,126 @@
+"""
+Shared thread registry for running app.py under `uvicorn --workers N`.
+
+One row per thread in a SQLite WAL table next to the checkpoints, visible to
+every worker process on the box. `version` moves forward whenever a turn
+starts or finishes, so a worker can tell its resident copy of a thread is
+stale, and a turn only starts if the version it read is still current
+(optimistic compare-and-set). A claimed turn holds a short lease so a worker
+that dies mid-run can't wedge the thread forever.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+RUN_LEASE_SECONDS = float(os.environ.get("RUN_LEASE_SECONDS", "60"))
+
+SQL_CREATE = """
+CREATE TABLE IF NOT EXISTS thread_versions (
+    thread_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    run_id TEXT,
+    lease_until REAL
+)
+"""
+SQL_INDEX = "CREATE INDEX IF NOT EXISTS thread_versions_updated ON thread_versions (updated_at DESC, thread_id DESC)"
+SQL_REGISTER = "INSERT OR IGNORE INTO thread_versions (thread_id, version, updated_at) VALUES (?, 0, ?)"
+SQL_CURRENT = "SELECT version FROM thread_versions WHERE thread_id = ?"
+SQL_IDS = "SELECT thread_id FROM thread_versions ORDER BY updated_at DESC"
+SQL_COUNT = "SELECT COUNT(*) FROM thread_versions"
+SQL_PAGE = """
+SELECT thread_id, version, updated_at, lease_until FROM thread_versions
+ORDER BY updated_at DESC, thread_id DESC LIMIT ? OFFSET ?
+"""
+SQL_PAGE_AFTER = """
+SELECT thread_id, version, updated_at, lease_until FROM thread_versions
+WHERE (updated_at, thread_id) < (?, ?)
+ORDER BY updated_at DESC, thread_id DESC LIMIT ? OFFSET ?
+"""
+SQL_CLAIM = """
+UPDATE thread_versions SET version = version + 1, run_id = ?, lease_until = ?, updated_at = ?
+WHERE thread_id = ? AND version = ? AND (lease_until IS NULL OR lease_until < ?)
+"""
+SQL_RELEASE = """
+UPDATE thread_versions SET version = version + 1, run_id = NULL, lease_until = NULL, updated_at = ?
+WHERE thread_id = ? AND run_id = ?
+"""
+
+class ThreadVersions:
+    """
+    Per-thread version counters shared by every worker through one SQLite file.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(SQL_CREATE)
+            conn.execute(SQL_INDEX)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, thread_id: str) -> bool:
+        """
+        Add a thread at version 0. True only for the one caller that created it.
+        """
+        conn = self._conn()
+        with conn:
+            return conn.execute(SQL_REGISTER, (thread_id, time.time())).rowcount == 1
+
+    def backfill(self, thread_ids: Iterable[str]):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.executemany(SQL_REGISTER, [(tid, now) for tid in thread_ids])
+
+    def current(self, thread_id: str) -> Optional[int]:
+        row = self._conn().execute(SQL_CURRENT, (thread_id,)).fetchone()
+        return row[0] if row else None
+
+    def ids(self) -> List[str]:
+        return [row[0] for row in self._conn().execute(SQL_IDS)]
+
+    def count(self) -> int:
+        return self._conn().execute(SQL_COUNT).fetchone()[0]
+
+    def page(self, limit: int, after: Optional[Tuple[float, str]] = None, offset: int = 0) -> List[Tuple]:
+        """
+        Up to `limit` (thread_id, version, updated_at, lease_until) rows, most
+        recently updated first, starting after the (updated_at, thread_id) key
+        of the previous page's last row.
+        """
+        if after is None:
+            return self._conn().execute(SQL_PAGE, (limit, offset)).fetchall()
+        return self._conn().execute(SQL_PAGE_AFTER, (after[0], after[1], limit, offset)).fetchall()
+
+    def claim(self, thread_id: str, expected_version: int) -> Optional[str]:
+        """
+        Start a turn on a thread last seen at `expected_version`. Returns a run
+        token for release(), or None if another turn got there first.
+        """
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(SQL_CLAIM, (run_id, now + RUN_LEASE_SECONDS, now, thread_id, expected_version, now))
+        return run_id if cur.rowcount == 1 else None
+
+    def release(self, thread_id: str, run_id: str) -> Optional[int]:
+        """
+        Finish a claimed turn; returns the thread's new version.
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute(SQL_RELEASE, (time.time(), thread_id, run_id))
+        return self.current(thread_id)
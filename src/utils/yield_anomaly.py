@@ -0,0 +1,79 @@
+"""
+Expected-yield anomaly scoring over weekly_metrics.
+
+"Performing normally" in the status check used to mean only that the site
+had no issue flag. This compares each site's production with what a system
+of its size should have made under the cloudiness it reported: a fleet-wide
+linear fit of yield per kW on cloudiness, times system_size_kw, summed over
+the site's readings. Sites below YIELD_ANOMALY_RATIO of that are flagged.
+
+Callers score each site's last YIELD_WINDOW_DAYS days, not just the week on
+display: with weekly readings a single week is one reading per site, never
+enough to pass YIELD_MIN_READINGS.
+
+The fit runs twice: the second pass leaves out the sites the first one
+flagged, so dead systems don't drag the fleet baseline down. Each pass is a
+few numpy group sums (bincount) over the metric rows, so the whole fleet is
+scored at once; see benchmarks/bench_anomaly.py.
+"""
+import os
+import numpy as np
+from typing import Dict, Tuple
+
+YIELD_ANOMALY_RATIO = float(os.environ.get("YIELD_ANOMALY_RATIO", "0.8"))
+# Fewer readings than this aren't enough to call a site under-producing
+YIELD_MIN_READINGS = int(os.environ.get("YIELD_MIN_READINGS", "3"))
+# Trailing days of readings each site is scored over
+YIELD_WINDOW_DAYS = int(os.environ.get("YIELD_WINDOW_DAYS", "28"))
+
+def fit_yield_curve(cloudiness: np.ndarray, yield_per_kw: np.ndarray, rows: np.ndarray) -> Tuple[float, float]:
+    """Least-squares (intercept, slope) of yield per kW on cloudiness over the selected rows."""
+    x, y = cloudiness[rows], yield_per_kw[rows]
+    if len(x) < 2:
+        return (float(y.mean()) if len(y) else 0.0), 0.0
+    x_mean, y_mean = x.mean(), y.mean()
+    spread = np.dot(x - x_mean, x - x_mean)
+    slope = np.dot(x - x_mean, y - y_mean) / spread if spread else 0.0
+    return float(y_mean - slope * x_mean), float(slope)
+
+def expected_yield(curve: Tuple[float, float], codes: np.ndarray, size_kw: np.ndarray,
+                   production: np.ndarray, cloudiness: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-site expected production under `curve`, summed over the rows with both readings, and their count."""
+    row_size = size_kw[codes]
+    intercept, slope = curve
+    with np.errstate(invalid="ignore"):
+        rows = ~np.isnan(production) & ~np.isnan(cloudiness) & (row_size > 0)
+        per_row = np.maximum(row_size * (intercept + slope * cloudiness), 0.0)
+    n = len(size_kw)
+    return (np.bincount(codes, weights=np.where(rows, per_row, 0.0), minlength=n),
+            np.bincount(codes, weights=rows.astype(np.float64), minlength=n))
+
+def score_yield(codes: np.ndarray, size_kw: np.ndarray, production: np.ndarray, cloudiness: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-site expected production, actual/expected ratio and under-producing
+    flag. `codes` maps each metric row to its site (0..n-1), `size_kw` is
+    indexed by site; production and cloudiness are per row, NaN when missing.
+    """
+    n = len(size_kw)
+    row_size = size_kw[codes]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rows = ~np.isnan(production) & ~np.isnan(cloudiness) & (row_size > 0)
+        yield_per_kw = np.where(rows, production / row_size, 0.0)
+    readings = np.bincount(codes, weights=rows.astype(np.float64), minlength=n)
+    actual = np.bincount(codes, weights=np.where(rows, production, 0.0), minlength=n)
+
+    def expected_for(curve: Tuple[float, float]) -> np.ndarray:
+        return expected_yield(curve, codes, size_kw, production, cloudiness)[0]
+
+    def flagged(expected: np.ndarray):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.where(expected > 0, actual / expected, np.nan)
+        return ratio, (readings >= YIELD_MIN_READINGS) & (ratio < YIELD_ANOMALY_RATIO)
+
+    curve = fit_yield_curve(cloudiness, yield_per_kw, rows)
+    _, under = flagged(expected_for(curve))
+    if under.any():
+        curve = fit_yield_curve(cloudiness, yield_per_kw, rows & ~under[codes])
+    expected = expected_for(curve)
+    ratio, under = flagged(expected)
+    return {"expected": expected, "ratio": ratio, "underproducing": under, "readings": readings, "curve": curve}